@@ -1,8 +1,97 @@
 import json
 import os
-import hashlib
-import psycopg2
-from typing import Dict, Any
+from types import MappingProxyType
+from typing import Dict, Any, Mapping
+# hashlib is imported where used, so a preflight's cold start does not pay for them
+
+JSON_HEADERS = MappingProxyType({'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'})
+PREFLIGHT_RESPONSE = MappingProxyType({
+    'statusCode': 200,
+    'headers': MappingProxyType({
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Allow-Methods': 'POST, OPTIONS',
+        'Access-Control-Allow-Headers': 'Content-Type',
+        'Access-Control-Max-Age': '86400'
+    }),
+    'body': '',
+    'isBase64Encoded': False
+})
+METHOD_NOT_ALLOWED = MappingProxyType({
+    'statusCode': 405,
+    'headers': JSON_HEADERS,
+    'body': json.dumps({'error': 'Method not allowed'}),
+    'isBase64Encoded': False
+})
+
+# Imported on first database use so CORS preflights never load the driver
+psycopg2: Any = None
+# Optional and slow to import, so it is loaded on first serialization too; False when missing
+orjson: Any = None
+
+def load_psycopg2() -> None:
+    global psycopg2
+    if psycopg2 is None:
+        import psycopg2 as driver
+        psycopg2 = driver
+
+def load_orjson() -> Any:
+    global orjson
+    if orjson is None:
+        try:
+            import orjson as encoder
+        except ImportError:
+            encoder = False
+        orjson = encoder
+    return orjson
+
+def dumps(payload: Any) -> str:
+    '''Serialize to JSON with orjson when available'''
+    if load_orjson():
+        return orjson.dumps(payload).decode('utf-8')
+    return json.dumps(payload)
+
+def copy_response(response: Mapping[str, Any]) -> Dict[str, Any]:
+    '''Fresh copy of a prebuilt response, so the runtime or a caller can change it safely'''
+    return {**response, 'headers': dict(response['headers'])}
+
+def json_response(status_code: int, payload: Any) -> Dict[str, Any]:
+    return {
+        'statusCode': status_code,
+        'headers': dict(JSON_HEADERS),
+        'body': dumps(payload),
+        'isBase64Encoded': False
+    }
+
+def register(cur: Any, conn: Any, username: str, password_hash: str) -> Dict[str, Any]:
+    cur.execute("SELECT id FROM users WHERE username = %s", (username,))
+    if cur.fetchone():
+        return json_response(400, {'error': 'Username already exists'})
+
+    cur.execute(
+        "INSERT INTO users (username, password_hash) VALUES (%s, %s) RETURNING id",
+        (username, password_hash)
+    )
+    user_id = cur.fetchone()[0]
+    conn.commit()
+
+    return json_response(201, {'success': True, 'userId': user_id, 'username': username})
+
+def login(cur: Any, conn: Any, username: str, password_hash: str) -> Dict[str, Any]:
+    cur.execute(
+        "SELECT id FROM users WHERE username = %s AND password_hash = %s",
+        (username, password_hash)
+    )
+    user = cur.fetchone()
+
+    if not user:
+        return json_response(401, {'error': 'Invalid username or password'})
+
+    return json_response(200, {'success': True, 'userId': user[0], 'username': username})
+
+ACTIONS = {
+    'register': register,
+    'login': login
+}
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
@@ -11,112 +100,39 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     Returns: HTTP response with user data or error
     '''
     method: str = event.get('httpMethod', 'GET')
-    
+
     if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': '',
-            'isBase64Encoded': False
-        }
-    
+        return copy_response(PREFLIGHT_RESPONSE)
+
     if method != 'POST':
-        return {
-            'statusCode': 405,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Method not allowed'}),
-            'isBase64Encoded': False
-        }
-    
-    body_str = event.get('body', '{}')
-    body = json.loads(body_str)
-    
+        return copy_response(METHOD_NOT_ALLOWED)
+
+    body = json.loads(event.get('body', '{}'))
+
     action = body.get('action')
     username = body.get('username', '').strip()
     password = body.get('password', '')
-    
+
     if not username or not password:
-        return {
-            'statusCode': 400,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Username and password required'}),
-            'isBase64Encoded': False
-        }
-    
+        return json_response(400, {'error': 'Username and password required'})
+
     if len(username) < 3 or len(username) > 50:
-        return {
-            'statusCode': 400,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Username must be 3-50 characters'}),
-            'isBase64Encoded': False
-        }
-    
+        return json_response(400, {'error': 'Username must be 3-50 characters'})
+
+    run_action = ACTIONS.get(action)
+    if run_action is None:
+        return json_response(400, {'error': 'Invalid action'})
+
+    import hashlib
     password_hash = hashlib.sha256(password.encode()).hexdigest()
-    
-    db_url = os.environ.get('DATABASE_URL')
-    conn = psycopg2.connect(db_url)
-    cur = conn.cursor()
-    
-    if action == 'register':
-        cur.execute("SELECT id FROM users WHERE username = %s", (username,))
-        if cur.fetchone():
+
+    load_psycopg2()
+    conn = psycopg2.connect(os.environ.get('DATABASE_URL'))
+    try:
+        cur = conn.cursor()
+        try:
+            return run_action(cur, conn, username, password_hash)
+        finally:
             cur.close()
-            conn.close()
-            return {
-                'statusCode': 400,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'error': 'Username already exists'}),
-                'isBase64Encoded': False
-            }
-        
-        cur.execute(
-            "INSERT INTO users (username, password_hash) VALUES (%s, %s) RETURNING id",
-            (username, password_hash)
-        )
-        user_id = cur.fetchone()[0]
-        conn.commit()
-        cur.close()
-        conn.close()
-        
-        return {
-            'statusCode': 201,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'success': True, 'userId': user_id, 'username': username}),
-            'isBase64Encoded': False
-        }
-    
-    elif action == 'login':
-        cur.execute(
-            "SELECT id FROM users WHERE username = %s AND password_hash = %s",
-            (username, password_hash)
-        )
-        user = cur.fetchone()
-        cur.close()
+    finally:
         conn.close()
-        
-        if not user:
-            return {
-                'statusCode': 401,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'error': 'Invalid username or password'}),
-                'isBase64Encoded': False
-            }
-        
-        return {
-            'statusCode': 200,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'success': True, 'userId': user[0], 'username': username}),
-            'isBase64Encoded': False
-        }
-    
-    return {
-        'statusCode': 400,
-        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-        'body': json.dumps({'error': 'Invalid action'}),
-        'isBase64Encoded': False
-    }
@@ -0,0 +1,158 @@
+'''
+Benchmark the cloud function handlers against a baseline revision, with the database driver stubbed out.
+
+Measures a cold start (fresh interpreter: import the module, answer one OPTIONS preflight)
+and a warm GET that builds the list body from canned rows.
+
+    python backend/bench_handlers.py                      # chat, news, contacts vs the baseline commit
+    python backend/bench_handlers.py news --rows 500
+    python backend/bench_handlers.py --real-driver        # cold start with the installed psycopg2
+'''
+import os
+import sys
+import time
+import types
+import argparse
+import tempfile
+import subprocess
+import importlib.util
+from datetime import datetime
+from typing import Dict, Any, List, Tuple, Callable
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_REV = '36943ed'
+
+NOW = datetime(2024, 9, 1, 8, 30)
+ROW_FACTORIES: Dict[str, Callable[[int], Tuple[Any, ...]]] = {
+    'chat': lambda i: (i, i % 50, f'user{i % 50}', f'message number {i}', NOW, i % 7 == 0),
+    'news': lambda i: (i, f'News {i}', 'text ' * 50, NOW, NOW),
+    'contacts': lambda i: (i, f'Contact {i}', f'+7900{i:07d}', 'ученик', NOW),
+}
+
+class StubCursor:
+    def __init__(self, rows: List[Tuple[Any, ...]]) -> None:
+        self.rows = rows
+
+    def execute(self, sql: Any, params: Any = None) -> None:
+        pass
+
+    def fetchall(self) -> List[Tuple[Any, ...]]:
+        return self.rows
+
+    def fetchone(self) -> Tuple[Any, ...]:
+        return self.rows[0]
+
+    def close(self) -> None:
+        pass
+
+class StubConnection:
+    autocommit = False
+
+    def __init__(self, rows: List[Tuple[Any, ...]]) -> None:
+        self.rows = rows
+
+    def cursor(self) -> StubCursor:
+        return StubCursor(self.rows)
+
+    def commit(self) -> None:
+        pass
+
+    def rollback(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+def install_stub_driver(rows: List[Tuple[Any, ...]]) -> None:
+    '''Register a fake psycopg2 in sys.modules whose connections return `rows` for every query'''
+    driver = types.ModuleType('psycopg2')
+    driver.Error = type('Error', (Exception,), {})
+    driver.OperationalError = type('OperationalError', (driver.Error,), {})
+    driver.InterfaceError = type('InterfaceError', (driver.Error,), {})
+    driver.connect = lambda *args, **kwargs: StubConnection(rows)
+    sys.modules['psycopg2'] = driver
+
+def load_module(path: str, name: str) -> Any:
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def baseline_source(function_name: str, rev: str, workdir: str) -> str:
+    source = subprocess.run(
+        ['git', 'show', f'{rev}:backend/{function_name}/index.py'],
+        cwd=BACKEND_DIR, check=True, capture_output=True, text=True
+    ).stdout
+    path = os.path.join(workdir, f"{function_name.replace('-', '_')}_baseline.py")
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(source)
+    return path
+
+def cold_start(path: str, runs: int, real_driver: bool) -> float:
+    '''Median seconds to import the module and answer OPTIONS, each run in a fresh interpreter'''
+    command = [sys.executable, os.path.abspath(__file__), '--cold-child', path]
+    if real_driver:
+        command.append('--real-driver')
+    timings = sorted(float(subprocess.run(command, check=True, capture_output=True, text=True).stdout) for _ in range(runs))
+    return timings[len(timings) // 2]
+
+def cold_child(path: str, real_driver: bool) -> None:
+    if not real_driver:
+        install_stub_driver([])
+    started = time.perf_counter()
+    module = load_module(path, 'cold_start')
+    module.handler({'httpMethod': 'OPTIONS'}, None)
+    print(time.perf_counter() - started)
+
+def warm_get(path: str, name: str, iterations: int) -> float:
+    '''Mean seconds per GET that renders the list body from the stubbed rows'''
+    module = load_module(path, name)
+    event = {'httpMethod': 'GET', 'queryStringParameters': {}}
+    module.handler(event, None)
+    started = time.perf_counter()
+    for _ in range(iterations):
+        module.handler(event, None)
+    return (time.perf_counter() - started) / iterations
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('functions', nargs='*', help=f"any of {', '.join(sorted(ROW_FACTORIES))} (default: all)")
+    parser.add_argument('--baseline', default=BASELINE_REV, help='git revision to compare against')
+    parser.add_argument('--rows', type=int, default=100, help='rows returned by the stubbed list query')
+    parser.add_argument('--runs', type=int, default=15, help='fresh interpreters per cold start measurement')
+    parser.add_argument('--iterations', type=int, default=2000, help='warm GET calls per measurement')
+    parser.add_argument('--real-driver', action='store_true', help='import the installed psycopg2 during cold starts')
+    parser.add_argument('--cold-child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.cold_child:
+        cold_child(args.cold_child, args.real_driver)
+        return
+
+    unknown = set(args.functions) - set(ROW_FACTORIES)
+    if unknown:
+        parser.error(f"no list rows to stub for {', '.join(sorted(unknown))}")
+
+    os.environ.setdefault('DATABASE_URL', 'postgresql://bench')
+    workdir = tempfile.mkdtemp(prefix='bench-handlers-')
+    os.environ.setdefault('SNAPSHOT_DIR', workdir)
+
+    print(f"{'function':<10} {'measure':<16} {'baseline':>12} {'current':>12} {'speedup':>8}")
+    for function_name in args.functions or sorted(ROW_FACTORIES):
+        install_stub_driver([ROW_FACTORIES[function_name](i) for i in range(1, args.rows + 1)])
+        paths = {
+            'baseline': baseline_source(function_name, args.baseline, workdir),
+            'current': os.path.join(BACKEND_DIR, function_name, 'index.py')
+        }
+        results = {
+            'cold OPTIONS': {label: cold_start(path, args.runs, args.real_driver) for label, path in paths.items()},
+            f'GET {args.rows} rows': {label: warm_get(path, f'{label}_{function_name}', args.iterations) for label, path in paths.items()}
+        }
+        for measure, timing in results.items():
+            print(
+                f"{function_name:<10} {measure:<16} {timing['baseline'] * 1e6:>10.1f}us "
+                f"{timing['current'] * 1e6:>10.1f}us {timing['baseline'] / timing['current']:>7.2f}x"
+            )
+
+if __name__ == '__main__':
+    main()
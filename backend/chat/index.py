@@ -1,264 +1,606 @@
 import json
 import os
-import psycopg2
-from typing import Dict, Any, List
+import re
+import time
+from collections import OrderedDict
+from types import MappingProxyType
+from typing import Dict, Any, Mapping, List, Optional, Set, Tuple, Callable
+# hashlib and random are imported where used, so a preflight's cold start does not pay for them
 
-def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
-    '''
-    Business: Chat messages API - send, retrieve, edit and delete messages
-    Args: event with httpMethod (GET/POST/PUT/DELETE), body with message data
-    Returns: HTTP response with messages array or success status
-    '''
-    method: str = event.get('httpMethod', 'GET')
-    
-    if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': '',
-            'isBase64Encoded': False
-        }
-    
-    db_url = os.environ.get('DATABASE_URL')
-    conn = psycopg2.connect(db_url)
-    cur = conn.cursor()
-    
-    if method == 'GET':
-        query_params = event.get('queryStringParameters') or {}
-        limit = int(query_params.get('limit', 100))
-        
-        cur.execute(
-            "SELECT m.id, m.user_id, m.username, m.message, m.created_at, "
-            "CASE WHEN a.user_id IS NOT NULL THEN true ELSE false END as is_admin "
-            "FROM messages m "
-            "LEFT JOIN admins a ON m.user_id = a.user_id "
-            "ORDER BY m.created_at DESC LIMIT %s",
-            (limit,)
-        )
-        
-        rows = cur.fetchall()
-        messages = []
-        for row in rows:
-            messages.append({
-                'id': row[0],
-                'userId': row[1],
-                'username': row[2],
-                'message': row[3],
-                'createdAt': row[4].isoformat(),
-                'isAdmin': row[5]
-            })
-        
-        messages.reverse()
-        
-        cur.close()
-        conn.close()
-        
+BREAKER_THRESHOLD = int(os.environ.get('DB_BREAKER_THRESHOLD', '3'))
+BREAKER_COOLDOWN = float(os.environ.get('DB_BREAKER_COOLDOWN', '30'))
+DB_CONNECT_TIMEOUT = int(os.environ.get('DB_CONNECT_TIMEOUT', '3'))
+DB_STATEMENT_TIMEOUT_MS = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', '5000'))
+DEFAULT_ROOM = 'general'
+MESSAGE_LIMIT = 100
+ROOM_ID_PATTERN = re.compile(r'^[a-z0-9_-]{1,50}$')
+IDEMPOTENCY_TTL_HOURS = int(os.environ.get('IDEMPOTENCY_TTL_HOURS', '24'))
+IDEMPOTENCY_CACHE_SIZE = 512
+IDEMPOTENCY_PURGE_RATE = 0.01
+SNAPSHOT_DIR = os.environ.get('SNAPSHOT_DIR') or os.path.join(os.environ.get('TMPDIR') or '/tmp', 'chat-snapshots')
+SNAPSHOT_CACHE_SIZE = int(os.environ.get('SNAPSHOT_CACHE_SIZE', '256'))
+SNAPSHOT_WRITE_INTERVAL = float(os.environ.get('SNAPSHOT_WRITE_INTERVAL', '30'))
+PRESENCE_SYNC_SECONDS = float(os.environ.get('PRESENCE_SYNC_SECONDS', '10'))
+ONLINE_WINDOW_SECONDS = 60
+PRESENCE_POLL_SECONDS = 10
+# Typing starting or stopping is flushed at once, renewals with the regular flush; another
+# container only reloads presence every PRESENCE_SYNC_SECONDS and ChatRoom polls every
+# PRESENCE_POLL_SECONDS, so a typing mark has to outlast both
+TYPING_SECONDS = PRESENCE_SYNC_SECONDS + PRESENCE_POLL_SECONDS
+
+JSON_HEADERS = MappingProxyType({'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'})
+PREFLIGHT_RESPONSE = MappingProxyType({
+    'statusCode': 200,
+    'headers': MappingProxyType({
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
+        'Access-Control-Allow-Headers': 'Content-Type, Idempotency-Key',
+        'Access-Control-Max-Age': '86400'
+    }),
+    'body': '',
+    'isBase64Encoded': False
+})
+METHOD_NOT_ALLOWED = MappingProxyType({
+    'statusCode': 405,
+    'headers': JSON_HEADERS,
+    'body': json.dumps({'error': 'Method not allowed'}),
+    'isBase64Encoded': False
+})
+SUCCESS = MappingProxyType({
+    'statusCode': 200,
+    'headers': JSON_HEADERS,
+    'body': json.dumps({'success': True}),
+    'isBase64Encoded': False
+})
+INVALID_ROOM = MappingProxyType({
+    'statusCode': 400,
+    'headers': JSON_HEADERS,
+    'body': json.dumps({'error': 'Invalid roomId'}),
+    'isBase64Encoded': False
+})
+
+# Imported on first database use so CORS preflights never load the driver
+psycopg2: Any = None
+# Optional and slow to import, so it is loaded on first serialization too; False when missing
+orjson: Any = None
+
+_breaker: Dict[str, float] = {'failures': 0, 'opened_at': 0.0}
+_snapshots: 'OrderedDict[str, Tuple[str, float, bool]]' = OrderedDict()
+_idempotent_responses: 'OrderedDict[str, Tuple[float, int, str]]' = OrderedDict()
+
+# Presence is buffered per warm container and exchanged with chat_presence at most
+# once per PRESENCE_SYNC_SECONDS, so plain heartbeats never cost a write each;
+# typing starting or stopping is flushed right away
+_heartbeats: Dict[Tuple[str, int], Tuple[str, float, float]] = {}
+_dirty_heartbeats: Set[Tuple[str, int]] = set()
+_presence_snapshot: Dict[str, List[Tuple[int, str, float, float]]] = {}
+_presence_state: Dict[str, float] = {'synced_at': 0.0}
+
+def load_psycopg2() -> None:
+    global psycopg2
+    if psycopg2 is None:
+        import psycopg2 as driver
+        psycopg2 = driver
+
+def load_orjson() -> Any:
+    global orjson
+    if orjson is None:
+        try:
+            import orjson as encoder
+        except ImportError:
+            encoder = False
+        orjson = encoder
+    return orjson
+
+def connect() -> Any:
+    '''Open a connection that fails fast when Postgres is slow, so the breaker can trip'''
+    return psycopg2.connect(
+        os.environ.get('DATABASE_URL'),
+        connect_timeout=DB_CONNECT_TIMEOUT,
+        options=f'-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}'
+    )
+
+def dumps(payload: Any) -> str:
+    '''Serialize to JSON with orjson when available; datetimes become ISO strings'''
+    if load_orjson():
+        return orjson.dumps(payload).decode('utf-8')
+    return json.dumps(payload, default=lambda value: value.isoformat())
+
+def copy_response(response: Mapping[str, Any]) -> Dict[str, Any]:
+    '''Fresh copy of a prebuilt response, so the runtime or a caller can change it safely'''
+    return {**response, 'headers': dict(response['headers'])}
+
+def json_response(status_code: int, payload: Any) -> Dict[str, Any]:
+    return {
+        'statusCode': status_code,
+        'headers': dict(JSON_HEADERS),
+        'body': dumps(payload),
+        'isBase64Encoded': False
+    }
+
+def breaker_is_open() -> bool:
+    '''True while the database is considered down and should not be contacted'''
+    if _breaker['failures'] < BREAKER_THRESHOLD:
+        return False
+    return time.time() - _breaker['opened_at'] < BREAKER_COOLDOWN
+
+def record_db_failure() -> None:
+    _breaker['failures'] += 1
+    if _breaker['failures'] >= BREAKER_THRESHOLD:
+        _breaker['opened_at'] = time.time()
+
+def record_db_success() -> None:
+    _breaker['failures'] = 0
+
+def snapshot_path(key: str) -> str:
+    import hashlib
+    digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+    return os.path.join(SNAPSHOT_DIR, f'{digest}.json')
+
+def write_snapshot_file(key: str, body: str) -> bool:
+    path = snapshot_path(key)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    try:
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(body)
+        os.replace(tmp_path, path)
+    except OSError:
+        return False
+    return True
+
+def remember_snapshot(key: str, body: str, written_at: float, on_disk: bool) -> None:
+    _snapshots[key] = (body, written_at, on_disk)
+    _snapshots.move_to_end(key)
+    while len(_snapshots) > SNAPSHOT_CACHE_SIZE:
+        _snapshots.popitem(last=False)
+
+def save_snapshot(key: str, body: str) -> None:
+    '''Remember the last good GET body in memory; copy it to local disk at most every SNAPSHOT_WRITE_INTERVAL'''
+    cached = _snapshots.get(key)
+    if cached is not None and cached[0] == body and cached[2]:
+        _snapshots.move_to_end(key)
+        return
+    # A body held back by the interval is still written by a later save, even an unchanged one
+    written_at = cached[1] if cached is not None else 0.0
+    on_disk = False
+    now = time.time()
+    if now - written_at >= SNAPSHOT_WRITE_INTERVAL and write_snapshot_file(key, body):
+        written_at, on_disk = now, True
+    remember_snapshot(key, body, written_at, on_disk)
+
+def load_snapshot(key: str) -> Optional[str]:
+    cached = _snapshots.get(key)
+    if cached is not None:
+        return cached[0]
+    try:
+        with open(snapshot_path(key), encoding='utf-8') as f:
+            body = f.read()
+    except OSError:
+        return None
+    remember_snapshot(key, body, time.time(), True)
+    return body
+
+def stale_response(snapshot_key: Optional[str]) -> Dict[str, Any]:
+    '''Serve the last good response marked as stale, or 503 if there is none'''
+    body = load_snapshot(snapshot_key) if snapshot_key else None
+    if body is None:
         return {
-            'statusCode': 200,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'messages': messages}),
+            'statusCode': 503,
+            'headers': {**JSON_HEADERS, 'Retry-After': str(int(BREAKER_COOLDOWN))},
+            'body': dumps({'error': 'Database temporarily unavailable'}),
             'isBase64Encoded': False
         }
-    
-    elif method == 'POST':
-        body_str = event.get('body', '{}')
-        body = json.loads(body_str)
-        
-        user_id = body.get('userId')
-        username = body.get('username', '').strip()
-        message = body.get('message', '').strip()
-        
-        if not user_id or not username or not message:
-            cur.close()
-            conn.close()
-            return {
-                'statusCode': 400,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'error': 'userId, username and message required'}),
-                'isBase64Encoded': False
-            }
-        
-        if len(message) > 1000:
-            cur.close()
-            conn.close()
-            return {
-                'statusCode': 400,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'error': 'Message too long (max 1000 characters)'}),
-                'isBase64Encoded': False
-            }
-        
-        if message == '/adminGive':
+    payload = json.loads(body)
+    payload['stale'] = True
+    return {
+        'statusCode': 200,
+        'headers': {**JSON_HEADERS, 'Access-Control-Expose-Headers': 'X-Stale', 'X-Stale': 'true'},
+        'body': dumps(payload),
+        'isBase64Encoded': False
+    }
+
+def message_limit(query_params: Dict[str, Any]) -> int:
+    return min(max(int(query_params.get('limit', MESSAGE_LIMIT)), 1), MESSAGE_LIMIT)
+
+def snapshot_key_for(event: Dict[str, Any]) -> str:
+    query_params = event.get('queryStringParameters') or {}
+    room_id = query_params.get('roomId') or DEFAULT_ROOM
+    return f'chat:{room_id}:{message_limit(query_params)}'
+
+def idempotency_key_for(event: Dict[str, Any]) -> Optional[str]:
+    '''Idempotency-Key header scoped to this function and the sending user'''
+    headers = event.get('headers') or {}
+    client_key = next((value for name, value in headers.items() if name.lower() == 'idempotency-key'), None)
+    if not client_key:
+        return None
+    try:
+        user_id = json.loads(event.get('body') or '{}').get('userId')
+    except (ValueError, AttributeError):
+        return None
+    return f'chat:{user_id}:{client_key[:100]}'
+
+def replayed_response(status_code: int, body: str) -> Dict[str, Any]:
+    return {
+        'statusCode': status_code,
+        'headers': {**JSON_HEADERS, 'Idempotent-Replayed': 'true'},
+        'body': body,
+        'isBase64Encoded': False
+    }
+
+def cached_idempotent_response(key: str) -> Optional[Dict[str, Any]]:
+    entry = _idempotent_responses.get(key)
+    if entry is None:
+        return None
+    expires_at, status_code, body = entry
+    if expires_at < time.time():
+        del _idempotent_responses[key]
+        return None
+    _idempotent_responses.move_to_end(key)
+    return replayed_response(status_code, body)
+
+def remember_idempotent_response(key: str, status_code: int, body: str) -> None:
+    _idempotent_responses[key] = (time.time() + IDEMPOTENCY_TTL_HOURS * 3600, status_code, body)
+    _idempotent_responses.move_to_end(key)
+    while len(_idempotent_responses) > IDEMPOTENCY_CACHE_SIZE:
+        _idempotent_responses.popitem(last=False)
+
+def claim_idempotency_key(cur: Any, key: str) -> Optional[Dict[str, Any]]:
+    '''Reserve the key for this request, or return the response stored for an earlier one'''
+    cur.execute(
+        "INSERT INTO idempotency_keys (key) VALUES (%s) "
+        "ON CONFLICT (key) DO UPDATE SET status_code = NULL, body = NULL, created_at = CURRENT_TIMESTAMP "
+        "WHERE idempotency_keys.created_at < CURRENT_TIMESTAMP - %s * INTERVAL '1 hour' "
+        "RETURNING key",
+        (key, IDEMPOTENCY_TTL_HOURS)
+    )
+    if cur.fetchone() is not None:
+        import random
+        if random.random() < IDEMPOTENCY_PURGE_RATE:
+            cur.execute(
+                "DELETE FROM idempotency_keys WHERE created_at < CURRENT_TIMESTAMP - %s * INTERVAL '1 hour'",
+                (IDEMPOTENCY_TTL_HOURS,)
+            )
+        return None
+
+    cur.execute("SELECT status_code, body FROM idempotency_keys WHERE key = %s", (key,))
+    stored = cur.fetchone()
+    if stored is None or stored[0] is None:
+        return json_response(409, {'error': 'A request with this Idempotency-Key is still in progress'})
+    remember_idempotent_response(key, stored[0], stored[1])
+    return replayed_response(stored[0], stored[1])
+
+def store_idempotent_response(cur: Any, key: str, status_code: int, body: str) -> None:
+    cur.execute(
+        "UPDATE idempotency_keys SET status_code = %s, body = %s WHERE key = %s",
+        (status_code, body, key)
+    )
+
+def record_heartbeat(room_id: str, user_id: int, username: str, typing: bool) -> bool:
+    '''Buffer a heartbeat; True when typing starts or stops, which should be flushed now'''
+    now = time.time()
+    previous = _heartbeats.get((room_id, user_id))
+    was_typing = previous is not None and previous[2] > now
+    _heartbeats[(room_id, user_id)] = (username, now, now + TYPING_SECONDS if typing else now)
+    _dirty_heartbeats.add((room_id, user_id))
+    return typing != was_typing
+
+def sync_presence(force: bool = False) -> None:
+    '''Flush buffered heartbeats and reload the shared snapshot, at most once per interval unless forced'''
+    now = time.time()
+    if (not force and now - _presence_state['synced_at'] < PRESENCE_SYNC_SECONDS) or breaker_is_open():
+        return
+    _presence_state['synced_at'] = now
+
+    load_psycopg2()
+    from psycopg2.extras import execute_values
+
+    pending = [(room_id, user_id) + _heartbeats[(room_id, user_id)] for room_id, user_id in _dirty_heartbeats]
+    try:
+        conn = connect()
+        try:
+            cur = conn.cursor()
+            if pending:
+                execute_values(
+                    cur,
+                    "INSERT INTO chat_presence (room_id, user_id, username, last_seen, typing_until) VALUES %s "
+                    "ON CONFLICT (room_id, user_id) DO UPDATE SET username = EXCLUDED.username, "
+                    "last_seen = GREATEST(chat_presence.last_seen, EXCLUDED.last_seen), "
+                    "typing_until = EXCLUDED.typing_until",
+                    pending,
+                    template="(%s, %s, %s, to_timestamp(%s), to_timestamp(%s))"
+                )
             cur.execute(
-                "INSERT INTO admins (user_id, username) VALUES (%s, %s) ON CONFLICT (user_id) DO NOTHING",
-                (user_id, username)
+                "DELETE FROM chat_presence WHERE last_seen < CURRENT_TIMESTAMP - %s * INTERVAL '1 second'",
+                (ONLINE_WINDOW_SECONDS,)
             )
+            cur.execute(
+                "SELECT room_id, user_id, username, EXTRACT(EPOCH FROM last_seen), EXTRACT(EPOCH FROM typing_until) "
+                "FROM chat_presence"
+            )
+            rows = cur.fetchall()
             conn.commit()
             cur.close()
+        finally:
             conn.close()
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'success': True, 'admin': True, 'message': 'Admin rights granted'}),
-                'isBase64Encoded': False
-            }
-        
-        cur.execute(
-            "INSERT INTO messages (user_id, username, message) VALUES (%s, %s, %s) RETURNING id, created_at",
-            (user_id, username, message)
-        )
-        
-        result = cur.fetchone()
-        message_id = result[0]
-        created_at = result[1]
-        
-        conn.commit()
-        cur.close()
-        conn.close()
-        
-        return {
-            'statusCode': 201,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({
-                'success': True,
-                'message': {
-                    'id': message_id,
-                    'username': username,
-                    'message': message,
-                    'createdAt': created_at.isoformat()
-                }
-            }),
-            'isBase64Encoded': False
-        }
-    
-    elif method == 'PUT':
-        body_str = event.get('body', '{}')
-        body = json.loads(body_str)
-        
-        message_id = body.get('messageId')
-        user_id = body.get('userId')
-        new_message = body.get('message', '').strip()
-        
-        if not message_id or not user_id or not new_message:
-            cur.close()
-            conn.close()
-            return {
-                'statusCode': 400,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'error': 'messageId, userId and message required'}),
-                'isBase64Encoded': False
-            }
-        
-        cur.execute(
-            "SELECT user_id FROM messages WHERE id = %s",
-            (message_id,)
-        )
-        result = cur.fetchone()
-        
-        if not result:
-            cur.close()
-            conn.close()
-            return {
-                'statusCode': 404,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'error': 'Message not found'}),
-                'isBase64Encoded': False
-            }
-        
-        if result[0] != user_id:
-            cur.close()
-            conn.close()
-            return {
-                'statusCode': 403,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'error': 'Not allowed to edit this message'}),
-                'isBase64Encoded': False
-            }
-        
-        cur.execute(
-            "UPDATE messages SET message = %s WHERE id = %s",
-            (new_message, message_id)
-        )
-        
-        conn.commit()
-        cur.close()
-        conn.close()
-        
-        return {
-            'statusCode': 200,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'success': True}),
-            'isBase64Encoded': False
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        record_db_failure()
+        return
+
+    record_db_success()
+    _dirty_heartbeats.clear()
+    _presence_snapshot.clear()
+    for room_id, user_id, username, last_seen, typing_until in rows:
+        _presence_snapshot.setdefault(room_id, []).append((user_id, username, float(last_seen), float(typing_until)))
+    for key in [key for key, entry in _heartbeats.items() if entry[1] < now - ONLINE_WINDOW_SECONDS]:
+        del _heartbeats[key]
+
+def room_presence(room_id: str) -> Dict[str, Any]:
+    '''Online users and who is typing, from the shared snapshot plus this container's own heartbeats'''
+    now = time.time()
+    latest: Dict[int, Tuple[str, float, float]] = {}
+    for user_id, username, last_seen, typing_until in _presence_snapshot.get(room_id, []):
+        latest[user_id] = (username, last_seen, typing_until)
+    for (heartbeat_room, user_id), entry in _heartbeats.items():
+        if heartbeat_room == room_id and (user_id not in latest or latest[user_id][1] < entry[1]):
+            latest[user_id] = entry
+
+    online = sorted(
+        ({'userId': user_id, 'username': entry[0]} for user_id, entry in latest.items() if entry[1] > now - ONLINE_WINDOW_SECONDS),
+        key=lambda user: user['username']
+    )
+    typing = sorted(entry[0] for entry in latest.values() if entry[2] > now)
+    return {'roomId': room_id, 'online': online, 'typing': typing}
+
+def heartbeat(event: Dict[str, Any]) -> Dict[str, Any]:
+    body = json.loads(event.get('body', '{}'))
+
+    user_id = body.get('userId')
+    username = str(body.get('username', '')).strip()
+    room_id = str(body.get('roomId') or DEFAULT_ROOM)
+
+    if not isinstance(user_id, int) or not username:
+        return json_response(400, {'error': 'userId and username required'})
+
+    if not ROOM_ID_PATTERN.match(room_id):
+        return copy_response(INVALID_ROOM)
+
+    typing_changed = record_heartbeat(room_id, user_id, username[:50], bool(body.get('typing')))
+    sync_presence(force=typing_changed)
+
+    return copy_response(SUCCESS)
+
+def presence(event: Dict[str, Any]) -> Dict[str, Any]:
+    query_params = event.get('queryStringParameters') or {}
+    room_id = query_params.get('roomId') or DEFAULT_ROOM
+
+    if not ROOM_ID_PATTERN.match(room_id):
+        return copy_response(INVALID_ROOM)
+
+    sync_presence()
+
+    return json_response(200, room_presence(room_id))
+
+def is_presence_request(event: Dict[str, Any], method: str) -> bool:
+    if method == 'GET':
+        return (event.get('queryStringParameters') or {}).get('view') == 'presence'
+    if method == 'POST':
+        try:
+            return json.loads(event.get('body') or '{}').get('action') == 'heartbeat'
+        except (ValueError, AttributeError):
+            return False
+    return False
+
+def list_messages(event: Dict[str, Any], conn: Any, cur: Any) -> Dict[str, Any]:
+    query_params = event.get('queryStringParameters') or {}
+    limit = message_limit(query_params)
+    room_id = query_params.get('roomId') or DEFAULT_ROOM
+
+    if not ROOM_ID_PATTERN.match(room_id):
+        return copy_response(INVALID_ROOM)
+
+    cur.execute(
+        "SELECT m.id, m.user_id, m.username, m.message, m.created_at, "
+        "CASE WHEN a.user_id IS NOT NULL THEN true ELSE false END as is_admin "
+        "FROM messages m "
+        "LEFT JOIN admins a ON m.user_id = a.user_id "
+        "WHERE m.room_id = %s "
+        "ORDER BY m.created_at DESC LIMIT %s",
+        (room_id, limit)
+    )
+    messages = [
+        {
+            'id': row[0],
+            'userId': row[1],
+            'username': row[2],
+            'message': row[3],
+            'createdAt': row[4],
+            'isAdmin': row[5],
+            'roomId': room_id
         }
-    
-    elif method == 'DELETE':
-        query_params = event.get('queryStringParameters') or {}
-        message_id = query_params.get('messageId')
-        user_id = query_params.get('userId')
-        
-        if not message_id or not user_id:
-            cur.close()
-            conn.close()
-            return {
-                'statusCode': 400,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'error': 'messageId and userId required'}),
-                'isBase64Encoded': False
-            }
-        
-        cur.execute(
-            "SELECT user_id FROM messages WHERE id = %s",
-            (int(message_id),)
-        )
-        result = cur.fetchone()
-        
-        if not result:
-            cur.close()
-            conn.close()
-            return {
-                'statusCode': 404,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'error': 'Message not found'}),
-                'isBase64Encoded': False
-            }
-        
-        if result[0] != int(user_id):
-            cur.close()
-            conn.close()
-            return {
-                'statusCode': 403,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'error': 'Not allowed to delete this message'}),
-                'isBase64Encoded': False
-            }
-        
+        for row in reversed(cur.fetchall())
+    ]
+
+    return json_response(200, {'messages': messages})
+
+def send_message(event: Dict[str, Any], conn: Any, cur: Any) -> Dict[str, Any]:
+    body = json.loads(event.get('body', '{}'))
+
+    user_id = body.get('userId')
+    username = body.get('username', '').strip()
+    message = body.get('message', '').strip()
+    room_id = str(body.get('roomId') or DEFAULT_ROOM)
+
+    if not user_id or not username or not message:
+        return json_response(400, {'error': 'userId, username and message required'})
+
+    if len(message) > 1000:
+        return json_response(400, {'error': 'Message too long (max 1000 characters)'})
+
+    if not ROOM_ID_PATTERN.match(room_id):
+        return copy_response(INVALID_ROOM)
+
+    if message == '/adminGive':
         cur.execute(
-            "DELETE FROM messages WHERE id = %s",
-            (int(message_id),)
+            "INSERT INTO admins (user_id, username) VALUES (%s, %s) ON CONFLICT (user_id) DO NOTHING",
+            (user_id, username)
         )
-        
         conn.commit()
-        cur.close()
-        conn.close()
-        
-        return {
-            'statusCode': 200,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'success': True}),
-            'isBase64Encoded': False
+        return json_response(200, {'success': True, 'admin': True, 'message': 'Admin rights granted'})
+
+    idempotency_key = idempotency_key_for(event)
+    if idempotency_key:
+        replay = claim_idempotency_key(cur, idempotency_key)
+        if replay:
+            return replay
+
+    cur.execute(
+        "INSERT INTO messages (user_id, username, message, room_id) VALUES (%s, %s, %s, %s) RETURNING id, created_at",
+        (user_id, username, message, room_id)
+    )
+    message_id, created_at = cur.fetchone()
+
+    response_body = dumps({
+        'success': True,
+        'message': {
+            'id': message_id,
+            'username': username,
+            'message': message,
+            'roomId': room_id,
+            'createdAt': created_at
         }
-    
-    cur.close()
-    conn.close()
-    
+    })
+
+    if idempotency_key:
+        store_idempotent_response(cur, idempotency_key, 201, response_body)
+
+    conn.commit()
+
+    if idempotency_key:
+        remember_idempotent_response(idempotency_key, 201, response_body)
+
     return {
-        'statusCode': 405,
-        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-        'body': json.dumps({'error': 'Method not allowed'}),
+        'statusCode': 201,
+        'headers': dict(JSON_HEADERS),
+        'body': response_body,
         'isBase64Encoded': False
-    }
\ No newline at end of file
+    }
+
+def edit_message(event: Dict[str, Any], conn: Any, cur: Any) -> Dict[str, Any]:
+    body = json.loads(event.get('body', '{}'))
+
+    message_id = body.get('messageId')
+    user_id = body.get('userId')
+    new_message = body.get('message', '').strip()
+
+    if not message_id or not user_id or not new_message:
+        return json_response(400, {'error': 'messageId, userId and message required'})
+
+    cur.execute(
+        "SELECT user_id FROM messages WHERE id = %s",
+        (message_id,)
+    )
+    result = cur.fetchone()
+
+    if not result:
+        return json_response(404, {'error': 'Message not found'})
+
+    if result[0] != user_id:
+        return json_response(403, {'error': 'Not allowed to edit this message'})
+
+    cur.execute(
+        "UPDATE messages SET message = %s WHERE id = %s",
+        (new_message, message_id)
+    )
+    conn.commit()
+
+    return copy_response(SUCCESS)
+
+def delete_message(event: Dict[str, Any], conn: Any, cur: Any) -> Dict[str, Any]:
+    query_params = event.get('queryStringParameters') or {}
+    message_id = query_params.get('messageId')
+    user_id = query_params.get('userId')
+
+    if not message_id or not user_id:
+        return json_response(400, {'error': 'messageId and userId required'})
+
+    cur.execute(
+        "SELECT user_id FROM messages WHERE id = %s",
+        (int(message_id),)
+    )
+    result = cur.fetchone()
+
+    if not result:
+        return json_response(404, {'error': 'Message not found'})
+
+    if result[0] != int(user_id):
+        return json_response(403, {'error': 'Not allowed to delete this message'})
+
+    cur.execute(
+        "DELETE FROM messages WHERE id = %s",
+        (int(message_id),)
+    )
+    conn.commit()
+
+    return copy_response(SUCCESS)
+
+ROUTES: Dict[str, Callable[[Dict[str, Any], Any, Any], Dict[str, Any]]] = {
+    'GET': list_messages,
+    'POST': send_message,
+    'PUT': edit_message,
+    'DELETE': delete_message
+}
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    '''
+    Business: Chat messages API - send, retrieve, edit and delete messages in a room; presence and typing
+    Args: event with httpMethod (GET/POST/PUT/DELETE), body with message data, roomId (defaults to general);
+          POST action=heartbeat (userId, username, typing) and GET view=presence for who is online
+    Returns: HTTP response with messages array, presence lists or success status
+    '''
+    method: str = event.get('httpMethod', 'GET')
+
+    if method == 'OPTIONS':
+        return copy_response(PREFLIGHT_RESPONSE)
+
+    route = ROUTES.get(method)
+    if route is None:
+        return copy_response(METHOD_NOT_ALLOWED)
+
+    if is_presence_request(event, method):
+        return heartbeat(event) if method == 'POST' else presence(event)
+
+    idempotency_key = idempotency_key_for(event) if method == 'POST' else None
+    if idempotency_key:
+        replay = cached_idempotent_response(idempotency_key)
+        if replay:
+            return replay
+
+    load_psycopg2()
+    snapshot_key = snapshot_key_for(event) if method == 'GET' else None
+
+    if breaker_is_open():
+        return stale_response(snapshot_key)
+
+    try:
+        response = run_route(route, event)
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        record_db_failure()
+        return stale_response(snapshot_key)
+
+    record_db_success()
+    if snapshot_key and response['statusCode'] == 200:
+        save_snapshot(snapshot_key, response['body'])
+
+    return response
+
+def run_route(route: Callable[[Dict[str, Any], Any, Any], Dict[str, Any]], event: Dict[str, Any]) -> Dict[str, Any]:
+    conn = connect()
+    try:
+        cur = conn.cursor()
+        try:
+            return route(event, conn, cur)
+        finally:
+            cur.close()
+    finally:
+        conn.close()
@@ -1,100 +1,429 @@
 import json
 import os
-import psycopg2
-from typing import Dict, Any
+import time
+from collections import OrderedDict
+from types import MappingProxyType
+from typing import Dict, Any, Mapping, Optional, Tuple, Callable
+# hashlib and random are imported where used, so a preflight's cold start does not pay for them
+
+SCHEMA = 't_p42286306_app_development_proj'
+BREAKER_THRESHOLD = int(os.environ.get('DB_BREAKER_THRESHOLD', '3'))
+BREAKER_COOLDOWN = float(os.environ.get('DB_BREAKER_COOLDOWN', '30'))
+DB_CONNECT_TIMEOUT = int(os.environ.get('DB_CONNECT_TIMEOUT', '3'))
+DB_STATEMENT_TIMEOUT_MS = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', '5000'))
+IDEMPOTENCY_TTL_HOURS = int(os.environ.get('IDEMPOTENCY_TTL_HOURS', '24'))
+IDEMPOTENCY_CACHE_SIZE = 512
+IDEMPOTENCY_PURGE_RATE = 0.01
+IDEMPOTENCY_TABLE = f'{SCHEMA}.idempotency_keys'
+LEADERBOARD_LIMIT = 10
+TRENDING_WINDOW_HOURS = 24
+SNAPSHOT_DIR = os.environ.get('SNAPSHOT_DIR') or os.path.join(os.environ.get('TMPDIR') or '/tmp', 'lesson-likes-snapshots')
+SNAPSHOT_CACHE_SIZE = int(os.environ.get('SNAPSHOT_CACHE_SIZE', '256'))
+SNAPSHOT_WRITE_INTERVAL = float(os.environ.get('SNAPSHOT_WRITE_INTERVAL', '30'))
+
+JSON_HEADERS = MappingProxyType({'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'})
+PREFLIGHT_RESPONSE = MappingProxyType({
+    'statusCode': 200,
+    'headers': MappingProxyType({
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
+        'Access-Control-Allow-Headers': 'Content-Type, Idempotency-Key',
+        'Access-Control-Max-Age': '86400'
+    }),
+    'body': '',
+    'isBase64Encoded': False
+})
+METHOD_NOT_ALLOWED = MappingProxyType({
+    'statusCode': 405,
+    'headers': JSON_HEADERS,
+    'body': json.dumps({'error': 'Method not allowed'}),
+    'isBase64Encoded': False
+})
+
+# Imported on first database use so CORS preflights never load the driver
+psycopg2: Any = None
+# Optional and slow to import, so it is loaded on first serialization too; False when missing
+orjson: Any = None
+
+_breaker: Dict[str, float] = {'failures': 0, 'opened_at': 0.0}
+_snapshots: 'OrderedDict[str, Tuple[str, float, bool]]' = OrderedDict()
+_idempotent_responses: 'OrderedDict[str, Tuple[float, int, str]]' = OrderedDict()
+
+def load_psycopg2() -> None:
+    global psycopg2
+    if psycopg2 is None:
+        import psycopg2 as driver
+        psycopg2 = driver
+
+def load_orjson() -> Any:
+    global orjson
+    if orjson is None:
+        try:
+            import orjson as encoder
+        except ImportError:
+            encoder = False
+        orjson = encoder
+    return orjson
+
+def connect() -> Any:
+    '''Open a connection that fails fast when Postgres is slow, so the breaker can trip'''
+    return psycopg2.connect(
+        os.environ.get('DATABASE_URL'),
+        connect_timeout=DB_CONNECT_TIMEOUT,
+        options=f'-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}'
+    )
+
+def dumps(payload: Any) -> str:
+    '''Serialize to JSON with orjson when available; datetimes become ISO strings'''
+    if load_orjson():
+        return orjson.dumps(payload).decode('utf-8')
+    return json.dumps(payload, default=lambda value: value.isoformat())
+
+def copy_response(response: Mapping[str, Any]) -> Dict[str, Any]:
+    '''Fresh copy of a prebuilt response, so the runtime or a caller can change it safely'''
+    return {**response, 'headers': dict(response['headers'])}
+
+def json_response(status_code: int, payload: Any) -> Dict[str, Any]:
+    return {
+        'statusCode': status_code,
+        'headers': dict(JSON_HEADERS),
+        'body': dumps(payload),
+        'isBase64Encoded': False
+    }
+
+def breaker_is_open() -> bool:
+    '''True while the database is considered down and should not be contacted'''
+    if _breaker['failures'] < BREAKER_THRESHOLD:
+        return False
+    return time.time() - _breaker['opened_at'] < BREAKER_COOLDOWN
+
+def record_db_failure() -> None:
+    _breaker['failures'] += 1
+    if _breaker['failures'] >= BREAKER_THRESHOLD:
+        _breaker['opened_at'] = time.time()
+
+def record_db_success() -> None:
+    _breaker['failures'] = 0
+
+def snapshot_path(key: str) -> str:
+    import hashlib
+    digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+    return os.path.join(SNAPSHOT_DIR, f'{digest}.json')
+
+def write_snapshot_file(key: str, body: str) -> bool:
+    path = snapshot_path(key)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    try:
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(body)
+        os.replace(tmp_path, path)
+    except OSError:
+        return False
+    return True
+
+def remember_snapshot(key: str, body: str, written_at: float, on_disk: bool) -> None:
+    _snapshots[key] = (body, written_at, on_disk)
+    _snapshots.move_to_end(key)
+    while len(_snapshots) > SNAPSHOT_CACHE_SIZE:
+        _snapshots.popitem(last=False)
+
+def save_snapshot(key: str, body: str) -> None:
+    '''Remember the last good GET body in memory; copy it to local disk at most every SNAPSHOT_WRITE_INTERVAL'''
+    cached = _snapshots.get(key)
+    if cached is not None and cached[0] == body and cached[2]:
+        _snapshots.move_to_end(key)
+        return
+    # A body held back by the interval is still written by a later save, even an unchanged one
+    written_at = cached[1] if cached is not None else 0.0
+    on_disk = False
+    now = time.time()
+    if now - written_at >= SNAPSHOT_WRITE_INTERVAL and write_snapshot_file(key, body):
+        written_at, on_disk = now, True
+    remember_snapshot(key, body, written_at, on_disk)
+
+def load_snapshot(key: str) -> Optional[str]:
+    cached = _snapshots.get(key)
+    if cached is not None:
+        return cached[0]
+    try:
+        with open(snapshot_path(key), encoding='utf-8') as f:
+            body = f.read()
+    except OSError:
+        return None
+    remember_snapshot(key, body, time.time(), True)
+    return body
+
+def stale_response(snapshot_key: Optional[str]) -> Dict[str, Any]:
+    '''Serve the last good response marked as stale, or 503 if there is none'''
+    body = load_snapshot(snapshot_key) if snapshot_key else None
+    if body is None:
+        return {
+            'statusCode': 503,
+            'headers': {**JSON_HEADERS, 'Retry-After': str(int(BREAKER_COOLDOWN))},
+            'body': dumps({'error': 'Database temporarily unavailable'}),
+            'isBase64Encoded': False
+        }
+    payload = json.loads(body)
+    payload['stale'] = True
+    return {
+        'statusCode': 200,
+        'headers': {**JSON_HEADERS, 'Access-Control-Expose-Headers': 'X-Stale', 'X-Stale': 'true'},
+        'body': dumps(payload),
+        'isBase64Encoded': False
+    }
+
+def leaderboard_window(params: Dict[str, Any]) -> Tuple[int, int]:
+    limit = min(max(int(params.get('limit', LEADERBOARD_LIMIT)), 1), 50)
+    hours = min(max(int(params.get('hours', TRENDING_WINDOW_HOURS)), 1), 24 * 7)
+    return limit, hours
+
+def snapshot_key_for(event: Dict[str, Any]) -> str:
+    '''One snapshot per subject or leaderboard window, shared by every user'''
+    params = event.get('queryStringParameters') or {}
+    if params.get('view') == 'leaderboard':
+        limit, hours = leaderboard_window(params)
+        return f'leaderboard:{limit}:{hours}'
+    return f"likes:{params.get('subject', '')}"
+
+def shared_snapshot_body(body: str) -> str:
+    '''Drop the caller's own like status so the snapshot can be served to anyone'''
+    payload = json.loads(body)
+    if 'hasLiked' not in payload:
+        return body
+    payload['hasLiked'] = False
+    return dumps(payload)
+
+def idempotency_key_for(event: Dict[str, Any]) -> Optional[str]:
+    '''Idempotency-Key header scoped to this function and the sending user'''
+    headers = event.get('headers') or {}
+    client_key = next((value for name, value in headers.items() if name.lower() == 'idempotency-key'), None)
+    if not client_key:
+        return None
+    try:
+        user_id = json.loads(event.get('body') or '{}').get('userId')
+    except (ValueError, AttributeError):
+        return None
+    return f'likes:{user_id}:{client_key[:100]}'
+
+def replayed_response(status_code: int, body: str) -> Dict[str, Any]:
+    return {
+        'statusCode': status_code,
+        'headers': {**JSON_HEADERS, 'Idempotent-Replayed': 'true'},
+        'body': body,
+        'isBase64Encoded': False
+    }
+
+def cached_idempotent_response(key: str) -> Optional[Dict[str, Any]]:
+    entry = _idempotent_responses.get(key)
+    if entry is None:
+        return None
+    expires_at, status_code, body = entry
+    if expires_at < time.time():
+        del _idempotent_responses[key]
+        return None
+    _idempotent_responses.move_to_end(key)
+    return replayed_response(status_code, body)
+
+def remember_idempotent_response(key: str, status_code: int, body: str) -> None:
+    _idempotent_responses[key] = (time.time() + IDEMPOTENCY_TTL_HOURS * 3600, status_code, body)
+    _idempotent_responses.move_to_end(key)
+    while len(_idempotent_responses) > IDEMPOTENCY_CACHE_SIZE:
+        _idempotent_responses.popitem(last=False)
+
+def claim_idempotency_key(cur: Any, key: str) -> Optional[Dict[str, Any]]:
+    '''Reserve the key for this request, or return the response stored for an earlier one'''
+    cur.execute(
+        f"INSERT INTO {IDEMPOTENCY_TABLE} (key) VALUES (%s) "
+        "ON CONFLICT (key) DO UPDATE SET status_code = NULL, body = NULL, created_at = CURRENT_TIMESTAMP "
+        "WHERE idempotency_keys.created_at < CURRENT_TIMESTAMP - %s * INTERVAL '1 hour' "
+        "RETURNING key",
+        (key, IDEMPOTENCY_TTL_HOURS)
+    )
+    if cur.fetchone() is not None:
+        import random
+        if random.random() < IDEMPOTENCY_PURGE_RATE:
+            cur.execute(
+                f"DELETE FROM {IDEMPOTENCY_TABLE} WHERE created_at < CURRENT_TIMESTAMP - %s * INTERVAL '1 hour'",
+                (IDEMPOTENCY_TTL_HOURS,)
+            )
+        return None
+
+    cur.execute(f"SELECT status_code, body FROM {IDEMPOTENCY_TABLE} WHERE key = %s", (key,))
+    stored = cur.fetchone()
+    if stored is None or stored[0] is None:
+        return json_response(409, {'error': 'A request with this Idempotency-Key is still in progress'})
+    remember_idempotent_response(key, stored[0], stored[1])
+    return replayed_response(stored[0], stored[1])
+
+def store_idempotent_response(cur: Any, key: str, status_code: int, body: str) -> None:
+    cur.execute(
+        f"UPDATE {IDEMPOTENCY_TABLE} SET status_code = %s, body = %s WHERE key = %s",
+        (status_code, body, key)
+    )
+
+def record_like_delta(cursor: Any, subject: str, liked_at: Any, delta: int) -> None:
+    '''Keep hourly and all-time rollups in step with a single like or unlike'''
+    cursor.execute(
+        f"INSERT INTO {SCHEMA}.lesson_likes_hourly (subject, bucket, likes) "
+        "VALUES (%s, date_trunc('hour', %s::timestamp), %s) "
+        "ON CONFLICT (subject, bucket) DO UPDATE SET likes = lesson_likes_hourly.likes + EXCLUDED.likes",
+        (subject, liked_at, delta)
+    )
+    cursor.execute(
+        f"INSERT INTO {SCHEMA}.lesson_likes_totals (subject, likes) VALUES (%s, %s) "
+        "ON CONFLICT (subject) DO UPDATE SET likes = lesson_likes_totals.likes + EXCLUDED.likes",
+        (subject, delta)
+    )
+
+def subject_likes(cursor: Any, subject: str) -> int:
+    '''Current like count from the all-time rollup, so it never scans the likes themselves'''
+    cursor.execute(f"SELECT likes FROM {SCHEMA}.lesson_likes_totals WHERE subject = %s", (subject,))
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+def get_leaderboard(cursor: Any, params: Dict[str, Any]) -> Dict[str, Any]:
+    limit, hours = leaderboard_window(params)
+
+    cursor.execute(
+        f"SELECT subject, likes FROM {SCHEMA}.lesson_likes_totals "
+        "WHERE likes > 0 ORDER BY likes DESC, subject LIMIT %s",
+        (limit,)
+    )
+    top = [{'subject': row[0], 'likes': row[1]} for row in cursor.fetchall()]
+
+    cursor.execute(
+        f"SELECT subject, SUM(likes) AS likes FROM {SCHEMA}.lesson_likes_hourly "
+        "WHERE bucket > date_trunc('hour', CURRENT_TIMESTAMP) - %s * INTERVAL '1 hour' "
+        "GROUP BY subject HAVING SUM(likes) > 0 ORDER BY likes DESC, subject LIMIT %s",
+        (hours, limit)
+    )
+    trending = [{'subject': row[0], 'likes': int(row[1])} for row in cursor.fetchall()]
+
+    return {'top': top, 'trending': trending, 'hours': hours}
+
+def get_likes(event: Dict[str, Any], conn: Any, cursor: Any) -> Dict[str, Any]:
+    conn.autocommit = True
+    params = event.get('queryStringParameters') or {}
+
+    if params.get('view') == 'leaderboard':
+        return json_response(200, get_leaderboard(cursor, params))
+
+    subject = params.get('subject', '')
+    user_id = params.get('userId', '')
+
+    likes_count = subject_likes(cursor, subject)
+
+    has_liked = False
+    if user_id.isdigit():
+        cursor.execute(
+            f"SELECT COUNT(*) FROM {SCHEMA}.lesson_likes WHERE subject = %s AND user_id = %s",
+            (subject, int(user_id))
+        )
+        has_liked = cursor.fetchone()[0] > 0
+
+    return json_response(200, {'likes': likes_count, 'hasLiked': has_liked})
+
+def toggle_like(event: Dict[str, Any], conn: Any, cursor: Any) -> Dict[str, Any]:
+    body_data = json.loads(event.get('body', '{}'))
+    user_id = body_data.get('userId')
+    subject = body_data.get('subject')
+    action = body_data.get('action', 'like')
+
+    idempotency_key = idempotency_key_for(event)
+    if idempotency_key:
+        replay = claim_idempotency_key(cursor, idempotency_key)
+        if replay:
+            return replay
+
+    if action == 'like':
+        cursor.execute(
+            f"INSERT INTO {SCHEMA}.lesson_likes (user_id, subject) VALUES (%s, %s) "
+            "ON CONFLICT (user_id, subject) DO NOTHING RETURNING created_at",
+            (user_id, subject)
+        )
+        delta = 1
+    else:
+        cursor.execute(
+            f"DELETE FROM {SCHEMA}.lesson_likes WHERE user_id = %s AND subject = %s RETURNING created_at",
+            (user_id, subject)
+        )
+        delta = -1
+
+    changed = cursor.fetchone()
+    if changed:
+        record_like_delta(cursor, subject, changed[0], delta)
+
+    likes_count = subject_likes(cursor, subject)
+    response_body = dumps({'likes': likes_count})
+
+    if idempotency_key:
+        store_idempotent_response(cursor, idempotency_key, 200, response_body)
+
+    conn.commit()
+
+    if idempotency_key:
+        remember_idempotent_response(idempotency_key, 200, response_body)
+
+    return {
+        'statusCode': 200,
+        'headers': dict(JSON_HEADERS),
+        'body': response_body,
+        'isBase64Encoded': False
+    }
+
+ROUTES: Dict[str, Callable[[Dict[str, Any], Any, Any], Dict[str, Any]]] = {
+    'GET': get_likes,
+    'POST': toggle_like
+}
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     Business: Handle lesson likes - get count and user like status, toggle likes
-    Args: event with httpMethod (GET/POST), queryStringParameters (subject, userId), body (for POST)
+    Args: event with httpMethod (GET/POST), queryStringParameters (subject, userId or view=leaderboard, limit, hours), body (for POST)
           context with request_id
-    Returns: HTTP response with likes count and hasLiked status
+    Returns: HTTP response with likes count and hasLiked status, or top/trending subjects
     '''
     method: str = event.get('httpMethod', 'GET')
-    
+
     if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': ''
-        }
-    
-    dsn = os.environ.get('DATABASE_URL')
-    schema = 't_p42286306_app_development_proj'
-    
-    conn = psycopg2.connect(dsn)
-    conn.autocommit = True
-    cursor = conn.cursor()
-    
+        return copy_response(PREFLIGHT_RESPONSE)
+
+    route = ROUTES.get(method)
+    if route is None:
+        return copy_response(METHOD_NOT_ALLOWED)
+
+    idempotency_key = idempotency_key_for(event) if method == 'POST' else None
+    if idempotency_key:
+        replay = cached_idempotent_response(idempotency_key)
+        if replay:
+            return replay
+
+    load_psycopg2()
+    snapshot_key = snapshot_key_for(event) if method == 'GET' else None
+
+    if breaker_is_open():
+        return stale_response(snapshot_key)
+
     try:
-        if method == 'GET':
-            params = event.get('queryStringParameters', {})
-            subject = params.get('subject', '')
-            user_id = params.get('userId', '')
-            
-            cursor.execute(
-                f"SELECT COUNT(*) FROM {schema}.lesson_likes WHERE subject = '{subject}'"
-            )
-            likes_count = cursor.fetchone()[0]
-            
-            has_liked = False
-            if user_id:
-                cursor.execute(
-                    f"SELECT COUNT(*) FROM {schema}.lesson_likes WHERE subject = '{subject}' AND user_id = {user_id}"
-                )
-                has_liked = cursor.fetchone()[0] > 0
-            
-            return {
-                'statusCode': 200,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'isBase64Encoded': False,
-                'body': json.dumps({'likes': likes_count, 'hasLiked': has_liked})
-            }
-        
-        elif method == 'POST':
-            body_data = json.loads(event.get('body', '{}'))
-            user_id = body_data.get('userId')
-            subject = body_data.get('subject')
-            action = body_data.get('action', 'like')
-            
-            if action == 'like':
-                cursor.execute(
-                    f"INSERT INTO {schema}.lesson_likes (user_id, subject) VALUES ({user_id}, '{subject}') ON CONFLICT (user_id, subject) DO NOTHING"
-                )
-            else:
-                cursor.execute(
-                    f"DELETE FROM {schema}.lesson_likes WHERE user_id = {user_id} AND subject = '{subject}'"
-                )
-            
-            cursor.execute(
-                f"SELECT COUNT(*) FROM {schema}.lesson_likes WHERE subject = '{subject}'"
-            )
-            likes_count = cursor.fetchone()[0]
-            
-            return {
-                'statusCode': 200,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'isBase64Encoded': False,
-                'body': json.dumps({'likes': likes_count})
-            }
-        
-        return {
-            'statusCode': 405,
-            'headers': {'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Method not allowed'})
-        }
-    
+        response = run_route(route, event)
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        record_db_failure()
+        return stale_response(snapshot_key)
+
+    record_db_success()
+    if snapshot_key and response['statusCode'] == 200:
+        save_snapshot(snapshot_key, shared_snapshot_body(response['body']))
+
+    return response
+
+def run_route(route: Callable[[Dict[str, Any], Any, Any], Dict[str, Any]], event: Dict[str, Any]) -> Dict[str, Any]:
+    conn = connect()
+    try:
+        cur = conn.cursor()
+        try:
+            return route(event, conn, cur)
+        finally:
+            cur.close()
     finally:
-        cursor.close()
         conn.close()
@@ -1,7 +1,306 @@
 import json
 import os
-import psycopg2
-from typing import Dict, Any
+import time
+from collections import OrderedDict
+from types import MappingProxyType
+from typing import Dict, Any, Mapping, Optional, Tuple, Callable
+# gzip and hashlib are imported where used, so a preflight's cold start does not pay for them
+
+BREAKER_THRESHOLD = int(os.environ.get('DB_BREAKER_THRESHOLD', '3'))
+BREAKER_COOLDOWN = float(os.environ.get('DB_BREAKER_COOLDOWN', '30'))
+DB_CONNECT_TIMEOUT = int(os.environ.get('DB_CONNECT_TIMEOUT', '3'))
+DB_STATEMENT_TIMEOUT_MS = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', '5000'))
+SNAPSHOT_DIR = os.environ.get('SNAPSHOT_DIR') or os.path.join(os.environ.get('TMPDIR') or '/tmp', 'news-snapshots')
+SNAPSHOT_CACHE_SIZE = int(os.environ.get('SNAPSHOT_CACHE_SIZE', '256'))
+SNAPSHOT_WRITE_INTERVAL = float(os.environ.get('SNAPSHOT_WRITE_INTERVAL', '30'))
+STATIC_SNAPSHOT_DIR = os.environ.get('STATIC_SNAPSHOT_DIR')
+PUBLISH_LOCK = 'publish:news'
+
+JSON_HEADERS = MappingProxyType({'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'})
+PREFLIGHT_RESPONSE = MappingProxyType({
+    'statusCode': 200,
+    'headers': MappingProxyType({
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
+        'Access-Control-Allow-Headers': 'Content-Type, X-User-Id',
+        'Access-Control-Max-Age': '86400'
+    }),
+    'body': '',
+    'isBase64Encoded': False
+})
+METHOD_NOT_ALLOWED = MappingProxyType({
+    'statusCode': 405,
+    'headers': JSON_HEADERS,
+    'body': json.dumps({'error': 'Method not allowed'}),
+    'isBase64Encoded': False
+})
+SUCCESS = MappingProxyType({
+    'statusCode': 200,
+    'headers': JSON_HEADERS,
+    'body': json.dumps({'success': True}),
+    'isBase64Encoded': False
+})
+
+# Imported on first database use so CORS preflights never load the driver
+psycopg2: Any = None
+# Optional and slow to import, so it is loaded on first serialization too; False when missing
+orjson: Any = None
+
+_breaker: Dict[str, float] = {'failures': 0, 'opened_at': 0.0}
+_snapshots: 'OrderedDict[str, Tuple[str, float, bool]]' = OrderedDict()
+
+def load_psycopg2() -> None:
+    global psycopg2
+    if psycopg2 is None:
+        import psycopg2 as driver
+        psycopg2 = driver
+
+def load_orjson() -> Any:
+    global orjson
+    if orjson is None:
+        try:
+            import orjson as encoder
+        except ImportError:
+            encoder = False
+        orjson = encoder
+    return orjson
+
+def connect() -> Any:
+    '''Open a connection that fails fast when Postgres is slow, so the breaker can trip'''
+    return psycopg2.connect(
+        os.environ.get('DATABASE_URL'),
+        connect_timeout=DB_CONNECT_TIMEOUT,
+        options=f'-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}'
+    )
+
+def dumps(payload: Any) -> str:
+    '''Serialize to JSON with orjson when available; datetimes become ISO strings'''
+    if load_orjson():
+        return orjson.dumps(payload).decode('utf-8')
+    return json.dumps(payload, default=lambda value: value.isoformat())
+
+def copy_response(response: Mapping[str, Any]) -> Dict[str, Any]:
+    '''Fresh copy of a prebuilt response, so the runtime or a caller can change it safely'''
+    return {**response, 'headers': dict(response['headers'])}
+
+def json_response(status_code: int, payload: Any) -> Dict[str, Any]:
+    return {
+        'statusCode': status_code,
+        'headers': dict(JSON_HEADERS),
+        'body': dumps(payload),
+        'isBase64Encoded': False
+    }
+
+def breaker_is_open() -> bool:
+    '''True while the database is considered down and should not be contacted'''
+    if _breaker['failures'] < BREAKER_THRESHOLD:
+        return False
+    return time.time() - _breaker['opened_at'] < BREAKER_COOLDOWN
+
+def record_db_failure() -> None:
+    _breaker['failures'] += 1
+    if _breaker['failures'] >= BREAKER_THRESHOLD:
+        _breaker['opened_at'] = time.time()
+
+def record_db_success() -> None:
+    _breaker['failures'] = 0
+
+def snapshot_path(key: str) -> str:
+    import hashlib
+    digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+    return os.path.join(SNAPSHOT_DIR, f'{digest}.json')
+
+def write_snapshot_file(key: str, body: str) -> bool:
+    path = snapshot_path(key)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    try:
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(body)
+        os.replace(tmp_path, path)
+    except OSError:
+        return False
+    return True
+
+def remember_snapshot(key: str, body: str, written_at: float, on_disk: bool) -> None:
+    _snapshots[key] = (body, written_at, on_disk)
+    _snapshots.move_to_end(key)
+    while len(_snapshots) > SNAPSHOT_CACHE_SIZE:
+        _snapshots.popitem(last=False)
+
+def save_snapshot(key: str, body: str) -> None:
+    '''Remember the last good GET body in memory; copy it to local disk at most every SNAPSHOT_WRITE_INTERVAL'''
+    cached = _snapshots.get(key)
+    if cached is not None and cached[0] == body and cached[2]:
+        _snapshots.move_to_end(key)
+        return
+    # A body held back by the interval is still written by a later save, even an unchanged one
+    written_at = cached[1] if cached is not None else 0.0
+    on_disk = False
+    now = time.time()
+    if now - written_at >= SNAPSHOT_WRITE_INTERVAL and write_snapshot_file(key, body):
+        written_at, on_disk = now, True
+    remember_snapshot(key, body, written_at, on_disk)
+
+def load_snapshot(key: str) -> Optional[str]:
+    cached = _snapshots.get(key)
+    if cached is not None:
+        return cached[0]
+    try:
+        with open(snapshot_path(key), encoding='utf-8') as f:
+            body = f.read()
+    except OSError:
+        return None
+    remember_snapshot(key, body, time.time(), True)
+    return body
+
+def stale_response(snapshot_key: Optional[str]) -> Dict[str, Any]:
+    '''Serve the last good response marked as stale, or 503 if there is none'''
+    body = load_snapshot(snapshot_key) if snapshot_key else None
+    if body is None:
+        return {
+            'statusCode': 503,
+            'headers': {**JSON_HEADERS, 'Retry-After': str(int(BREAKER_COOLDOWN))},
+            'body': dumps({'error': 'Database temporarily unavailable'}),
+            'isBase64Encoded': False
+        }
+    payload = json.loads(body)
+    payload['stale'] = True
+    return {
+        'statusCode': 200,
+        'headers': {**JSON_HEADERS, 'Access-Control-Expose-Headers': 'X-Stale', 'X-Stale': 'true'},
+        'body': dumps(payload),
+        'isBase64Encoded': False
+    }
+
+def render_news(cur: Any) -> str:
+    cur.execute(
+        "SELECT id, title, content, created_at, updated_at FROM news ORDER BY created_at DESC"
+    )
+    news_list = [
+        {'id': row[0], 'title': row[1], 'content': row[2], 'createdAt': row[3], 'updatedAt': row[4]}
+        for row in cur.fetchall()
+    ]
+    return dumps({'news': news_list})
+
+def publish_news(conn: Any, cur: Any) -> None:
+    '''Regenerate news.json and news.json.gz after a write so they can be served statically'''
+    # Concurrent writers take turns and render only once they hold the lock,
+    # so the file written last always reflects the latest commit
+    try:
+        cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (PUBLISH_LOCK,))
+        body = render_news(cur)
+        save_snapshot('news', body)
+        if STATIC_SNAPSHOT_DIR:
+            write_static_files(body)
+        conn.commit()
+    except (psycopg2.Error, OSError) as e:
+        print(f'news publish failed: {e!r}')
+        # A file that missed this write would keep serving the old list; without it clients read the function GET
+        if STATIC_SNAPSHOT_DIR:
+            remove_static_files()
+        conn.rollback()
+
+def write_static_files(body: str) -> None:
+    import gzip
+    raw = body.encode('utf-8')
+    os.makedirs(STATIC_SNAPSHOT_DIR, exist_ok=True)
+    for filename, data in (('news.json', raw), ('news.json.gz', gzip.compress(raw, 9, mtime=0))):
+        path = os.path.join(STATIC_SNAPSHOT_DIR, filename)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+def remove_static_files() -> None:
+    for filename in ('news.json', 'news.json.gz'):
+        try:
+            os.remove(os.path.join(STATIC_SNAPSHOT_DIR, filename))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f'news static file removal failed: {e!r}')
+
+def list_news(event: Dict[str, Any], conn: Any, cur: Any) -> Dict[str, Any]:
+    return {
+        'statusCode': 200,
+        'headers': dict(JSON_HEADERS),
+        'body': render_news(cur),
+        'isBase64Encoded': False
+    }
+
+def create_news(event: Dict[str, Any], conn: Any, cur: Any) -> Dict[str, Any]:
+    body = json.loads(event.get('body', '{}'))
+
+    title = body.get('title', '').strip()
+    content = body.get('content', '').strip()
+
+    if not title or not content:
+        return json_response(400, {'error': 'Title and content required'})
+
+    cur.execute(
+        "INSERT INTO news (title, content) VALUES (%s, %s) RETURNING id, created_at, updated_at",
+        (title, content)
+    )
+    news_id, created_at, updated_at = cur.fetchone()
+
+    conn.commit()
+    publish_news(conn, cur)
+
+    return json_response(201, {
+        'success': True,
+        'news': {
+            'id': news_id,
+            'title': title,
+            'content': content,
+            'createdAt': created_at,
+            'updatedAt': updated_at
+        }
+    })
+
+def update_news(event: Dict[str, Any], conn: Any, cur: Any) -> Dict[str, Any]:
+    body = json.loads(event.get('body', '{}'))
+
+    news_id = body.get('id')
+    title = body.get('title', '').strip()
+    content = body.get('content', '').strip()
+
+    if not news_id or not title or not content:
+        return json_response(400, {'error': 'ID, title and content required'})
+
+    cur.execute(
+        "UPDATE news SET title = %s, content = %s, updated_at = CURRENT_TIMESTAMP WHERE id = %s",
+        (title, content, news_id)
+    )
+
+    conn.commit()
+    publish_news(conn, cur)
+
+    return copy_response(SUCCESS)
+
+def delete_news(event: Dict[str, Any], conn: Any, cur: Any) -> Dict[str, Any]:
+    query_params = event.get('queryStringParameters') or {}
+    news_id = query_params.get('id')
+
+    if not news_id:
+        return json_response(400, {'error': 'ID required'})
+
+    cur.execute(
+        "DELETE FROM news WHERE id = %s",
+        (int(news_id),)
+    )
+
+    conn.commit()
+    publish_news(conn, cur)
+
+    return copy_response(SUCCESS)
+
+ROUTES: Dict[str, Callable[[Dict[str, Any], Any, Any], Dict[str, Any]]] = {
+    'GET': list_news,
+    'POST': create_news,
+    'PUT': update_news,
+    'DELETE': delete_news
+}
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
@@ -11,166 +310,39 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     Returns: HTTP response with news data
     '''
     method: str = event.get('httpMethod', 'GET')
-    
+
     if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': ''
-        }
-    
-    dsn = os.environ.get('DATABASE_URL')
-    conn = psycopg2.connect(dsn)
-    cur = conn.cursor()
-    
-    if method == 'GET':
-        cur.execute(
-            "SELECT id, title, content, created_at, updated_at FROM news ORDER BY created_at DESC"
-        )
-        rows = cur.fetchall()
-        
-        news_list = []
-        for row in rows:
-            news_list.append({
-                'id': row[0],
-                'title': row[1],
-                'content': row[2],
-                'createdAt': row[3].isoformat(),
-                'updatedAt': row[4].isoformat()
-            })
-        
-        cur.close()
-        conn.close()
-        
-        return {
-            'statusCode': 200,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'news': news_list}),
-            'isBase64Encoded': False
-        }
-    
-    elif method == 'POST':
-        body_str = event.get('body', '{}')
-        body = json.loads(body_str)
-        
-        title = body.get('title', '').strip()
-        content = body.get('content', '').strip()
-        
-        if not title or not content:
-            cur.close()
-            conn.close()
-            return {
-                'statusCode': 400,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'error': 'Title and content required'}),
-                'isBase64Encoded': False
-            }
-        
-        cur.execute(
-            "INSERT INTO news (title, content) VALUES (%s, %s) RETURNING id, created_at, updated_at",
-            (title, content)
-        )
-        
-        result = cur.fetchone()
-        news_id = result[0]
-        created_at = result[1]
-        updated_at = result[2]
-        
-        conn.commit()
-        cur.close()
-        conn.close()
-        
-        return {
-            'statusCode': 201,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({
-                'success': True,
-                'news': {
-                    'id': news_id,
-                    'title': title,
-                    'content': content,
-                    'createdAt': created_at.isoformat(),
-                    'updatedAt': updated_at.isoformat()
-                }
-            }),
-            'isBase64Encoded': False
-        }
-    
-    elif method == 'PUT':
-        body_str = event.get('body', '{}')
-        body = json.loads(body_str)
-        
-        news_id = body.get('id')
-        title = body.get('title', '').strip()
-        content = body.get('content', '').strip()
-        
-        if not news_id or not title or not content:
-            cur.close()
-            conn.close()
-            return {
-                'statusCode': 400,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'error': 'ID, title and content required'}),
-                'isBase64Encoded': False
-            }
-        
-        cur.execute(
-            "UPDATE news SET title = %s, content = %s, updated_at = CURRENT_TIMESTAMP WHERE id = %s",
-            (title, content, news_id)
-        )
-        
-        conn.commit()
-        cur.close()
-        conn.close()
-        
-        return {
-            'statusCode': 200,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'success': True}),
-            'isBase64Encoded': False
-        }
-    
-    elif method == 'DELETE':
-        query_params = event.get('queryStringParameters') or {}
-        news_id = query_params.get('id')
-        
-        if not news_id:
+        return copy_response(PREFLIGHT_RESPONSE)
+
+    route = ROUTES.get(method)
+    if route is None:
+        return copy_response(METHOD_NOT_ALLOWED)
+
+    load_psycopg2()
+    snapshot_key = 'news' if method == 'GET' else None
+
+    if breaker_is_open():
+        return stale_response(snapshot_key)
+
+    try:
+        response = run_route(route, event)
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        record_db_failure()
+        return stale_response(snapshot_key)
+
+    record_db_success()
+    if snapshot_key and response['statusCode'] == 200:
+        save_snapshot(snapshot_key, response['body'])
+
+    return response
+
+def run_route(route: Callable[[Dict[str, Any], Any, Any], Dict[str, Any]], event: Dict[str, Any]) -> Dict[str, Any]:
+    conn = connect()
+    try:
+        cur = conn.cursor()
+        try:
+            return route(event, conn, cur)
+        finally:
             cur.close()
-            conn.close()
-            return {
-                'statusCode': 400,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'error': 'ID required'}),
-                'isBase64Encoded': False
-            }
-        
-        cur.execute(
-            "DELETE FROM news WHERE id = %s",
-            (int(news_id),)
-        )
-        
-        conn.commit()
-        cur.close()
+    finally:
         conn.close()
-        
-        return {
-            'statusCode': 200,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'success': True}),
-            'isBase64Encoded': False
-        }
-    
-    cur.close()
-    conn.close()
-    
-    return {
-        'statusCode': 405,
-        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-        'body': json.dumps({'error': 'Method not allowed'}),
-        'isBase64Encoded': False
-    }
@@ -0,0 +1,252 @@
+import json
+import os
+from types import MappingProxyType
+from typing import Dict, Any, Mapping, List, Tuple, Optional
+# random is imported where used, so a preflight's cold start does not pay for it
+
+SCHEMA = 't_p42286306_app_development_proj'
+MAX_CHANGES = 1000
+CHANGES_RETENTION_DAYS = int(os.environ.get('CHANGES_RETENTION_DAYS', '30'))
+CHANGES_PURGE_RATE = 0.01
+DB_CONNECT_TIMEOUT = int(os.environ.get('DB_CONNECT_TIMEOUT', '3'))
+DB_STATEMENT_TIMEOUT_MS = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', '5000'))
+# Same wait the other functions' breakers ask clients for
+RETRY_AFTER_SECONDS = int(float(os.environ.get('DB_BREAKER_COOLDOWN', '30')))
+
+JSON_HEADERS = MappingProxyType({'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'})
+PREFLIGHT_RESPONSE = MappingProxyType({
+    'statusCode': 200,
+    'headers': MappingProxyType({
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Allow-Methods': 'GET, OPTIONS',
+        'Access-Control-Allow-Headers': 'Content-Type',
+        'Access-Control-Max-Age': '86400'
+    }),
+    'body': '',
+    'isBase64Encoded': False
+})
+METHOD_NOT_ALLOWED = MappingProxyType({
+    'statusCode': 405,
+    'headers': JSON_HEADERS,
+    'body': json.dumps({'error': 'Method not allowed'}),
+    'isBase64Encoded': False
+})
+UNAVAILABLE = MappingProxyType({
+    'statusCode': 503,
+    'headers': MappingProxyType({**JSON_HEADERS, 'Retry-After': str(RETRY_AFTER_SECONDS)}),
+    'body': json.dumps({'error': 'Database temporarily unavailable'}),
+    'isBase64Encoded': False
+})
+
+# Imported on first database use so CORS preflights never load the driver
+psycopg2: Any = None
+# Optional and slow to import, so it is loaded on first serialization too; False when missing
+orjson: Any = None
+
+def load_psycopg2() -> None:
+    global psycopg2
+    if psycopg2 is None:
+        import psycopg2 as driver
+        psycopg2 = driver
+
+def connect() -> Any:
+    '''Open a connection that fails fast when Postgres is slow'''
+    return psycopg2.connect(
+        os.environ.get('DATABASE_URL'),
+        connect_timeout=DB_CONNECT_TIMEOUT,
+        options=f'-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}'
+    )
+
+def load_orjson() -> Any:
+    global orjson
+    if orjson is None:
+        try:
+            import orjson as encoder
+        except ImportError:
+            encoder = False
+        orjson = encoder
+    return orjson
+
+def dumps(payload: Any) -> str:
+    '''Serialize to JSON with orjson when available; datetimes become ISO strings'''
+    if load_orjson():
+        return orjson.dumps(payload).decode('utf-8')
+    return json.dumps(payload, default=lambda value: value.isoformat())
+
+def copy_response(response: Mapping[str, Any]) -> Dict[str, Any]:
+    '''Fresh copy of a prebuilt response, so the runtime or a caller can change it safely'''
+    return {**response, 'headers': dict(response['headers'])}
+
+def json_response(status_code: int, payload: Any) -> Dict[str, Any]:
+    return {
+        'statusCode': status_code,
+        'headers': dict(JSON_HEADERS),
+        'body': dumps(payload),
+        'isBase64Encoded': False
+    }
+
+def fetch_news(cur: Any, ids: Optional[List[int]] = None) -> List[Dict[str, Any]]:
+    if ids is None:
+        cur.execute("SELECT id, title, content, created_at, updated_at FROM news ORDER BY created_at DESC")
+    else:
+        cur.execute(
+            "SELECT id, title, content, created_at, updated_at FROM news WHERE id = ANY(%s) ORDER BY created_at DESC",
+            (ids,)
+        )
+    return [
+        {'id': row[0], 'title': row[1], 'content': row[2], 'createdAt': row[3], 'updatedAt': row[4]}
+        for row in cur.fetchall()
+    ]
+
+def fetch_contacts(cur: Any, ids: Optional[List[int]] = None) -> List[Dict[str, Any]]:
+    if ids is None:
+        cur.execute("SELECT id, name, phone, role, created_at FROM contacts ORDER BY created_at DESC")
+    else:
+        cur.execute(
+            "SELECT id, name, phone, role, created_at FROM contacts WHERE id = ANY(%s) ORDER BY created_at DESC",
+            (ids,)
+        )
+    return [
+        {'id': row[0], 'name': row[1], 'phone': row[2], 'role': row[3], 'createdAt': row[4]}
+        for row in cur.fetchall()
+    ]
+
+def fetch_likes(cur: Any, subjects: List[str]) -> List[Dict[str, Any]]:
+    cur.execute(
+        f"SELECT subject, likes FROM {SCHEMA}.lesson_likes_totals WHERE subject = ANY(%s)",
+        (subjects,)
+    )
+    found = dict(cur.fetchall())
+    return [{'subject': subject, 'likes': found.get(subject, 0)} for subject in subjects]
+
+def snapshot_xmin(cur: Any) -> int:
+    '''Oldest transaction still running; the changes of every older one are final'''
+    cur.execute("SELECT txid_snapshot_xmin(txid_current_snapshot())")
+    return cur.fetchone()[0]
+
+def full_state(cur: Any) -> Dict[str, Any]:
+    '''Everything a client needs before it can start syncing incrementally'''
+    # Taken before the reads: changes that land in between are sent again later, never lost
+    version = snapshot_xmin(cur)
+
+    cur.execute(f"SELECT subject, likes FROM {SCHEMA}.lesson_likes_totals WHERE likes > 0")
+    likes = [{'subject': row[0], 'likes': row[1]} for row in cur.fetchall()]
+
+    return {
+        'version': version,
+        'full': True,
+        'hasMore': False,
+        'news': {'upserts': fetch_news(cur), 'deletes': []},
+        'contacts': {'upserts': fetch_contacts(cur), 'deletes': []},
+        'likes': {'upserts': likes, 'deletes': []}
+    }
+
+def cursor_expired(cur: Any, since: int) -> bool:
+    '''True when changes the client has not seen yet may already have been purged'''
+    cur.execute(f"SELECT MIN(txid) FROM {SCHEMA}.changes")
+    oldest = cur.fetchone()[0]
+    return oldest is not None and since < oldest
+
+def purge_changes(cur: Any) -> None:
+    '''Drop whole transactions older than the retention window, always keeping the newest one'''
+    # Every purged txid ends up below the oldest kept one, which is what cursor_expired relies on
+    cur.execute(
+        f"DELETE FROM {SCHEMA}.changes "
+        f"WHERE txid <= (SELECT MAX(txid) FROM {SCHEMA}.changes WHERE changed_at < LOCALTIMESTAMP - %s * INTERVAL '1 day') "
+        f"AND txid < (SELECT MAX(txid) FROM {SCHEMA}.changes)",
+        (CHANGES_RETENTION_DAYS,)
+    )
+
+def changes_since(cur: Any, since: int, limit: int) -> Dict[str, Any]:
+    '''Collapse the changes of transactions from `since` up to the snapshot xmin into current upserts and deletes'''
+    xmin = snapshot_xmin(cur)
+    cur.execute(
+        f"SELECT txid, entity, entity_key FROM {SCHEMA}.changes "
+        "WHERE txid >= %s AND txid < %s ORDER BY txid, version LIMIT %s",
+        (since, xmin, limit + 1)
+    )
+    rows: List[Tuple[int, str, str]] = cur.fetchall()
+    has_more = len(rows) > limit
+    version = max(since, xmin)
+
+    if has_more:
+        # Pages end on a transaction boundary, so the next one starts at a whole transaction
+        version = rows[limit][0]
+        rows = [row for row in rows if row[0] < version]
+        if not rows:
+            cur.execute(
+                f"SELECT txid, entity, entity_key FROM {SCHEMA}.changes WHERE txid = %s ORDER BY version",
+                (version,)
+            )
+            rows = cur.fetchall()
+            version += 1
+
+    changed: Dict[str, List[str]] = {'news': [], 'contacts': [], 'likes': []}
+    for _, entity, entity_key in rows:
+        keys = changed.get(entity)
+        if keys is not None and entity_key not in keys:
+            keys.append(entity_key)
+
+    news_ids = [int(key) for key in changed['news']]
+    contact_ids = [int(key) for key in changed['contacts']]
+    news = fetch_news(cur, news_ids) if news_ids else []
+    contacts = fetch_contacts(cur, contact_ids) if contact_ids else []
+    likes = fetch_likes(cur, changed['likes']) if changed['likes'] else []
+
+    # A row that is gone now was deleted, whatever happened to it in between
+    live_news = {item['id'] for item in news}
+    live_contacts = {item['id'] for item in contacts}
+
+    return {
+        'version': version,
+        'full': False,
+        'hasMore': has_more,
+        'news': {'upserts': news, 'deletes': [i for i in news_ids if i not in live_news]},
+        'contacts': {'upserts': contacts, 'deletes': [i for i in contact_ids if i not in live_contacts]},
+        'likes': {'upserts': likes, 'deletes': []}
+    }
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    '''
+    Business: Sync news, contacts and like counts - return only what changed after the client's version
+    Args: event with httpMethod (GET), queryStringParameters (since = version from the last response, limit);
+          without since, or with one older than the retained changes, returns full state
+    Returns: HTTP response with new version and upserts/deletes per entity
+    '''
+    method: str = event.get('httpMethod', 'GET')
+
+    if method == 'OPTIONS':
+        return copy_response(PREFLIGHT_RESPONSE)
+
+    if method != 'GET':
+        return copy_response(METHOD_NOT_ALLOWED)
+
+    params = event.get('queryStringParameters') or {}
+    since = params.get('since')
+    limit = min(max(int(params.get('limit', MAX_CHANGES)), 1), MAX_CHANGES)
+
+    if since is not None and not since.isdigit():
+        return json_response(400, {'error': 'since must be a non-negative integer'})
+
+    load_psycopg2()
+    try:
+        conn = connect()
+        conn.autocommit = True
+        try:
+            cur = conn.cursor()
+            try:
+                if since is None or cursor_expired(cur, int(since)):
+                    payload = full_state(cur)
+                else:
+                    payload = changes_since(cur, int(since), limit)
+                import random
+                if random.random() < CHANGES_PURGE_RATE:
+                    purge_changes(cur)
+            finally:
+                cur.close()
+        finally:
+            conn.close()
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        return copy_response(UNAVAILABLE)
+
+    return json_response(200, payload)
@@ -0,0 +1,278 @@
+'''
+Query plan checks: every statement the cloud functions run, under EXPLAIN (ANALYZE, BUFFERS) on seeded data.
+
+Needs a scratch Postgres database; skipped unless QUERY_PLAN_TEST_DSN is set:
+    QUERY_PLAN_TEST_DSN=postgresql://localhost/plans python -m pytest backend/test_query_plans.py
+The suite applies db_migrations/*.sql into the functions' schema, seeds it, and drops the schema when done.
+'''
+import os
+import glob
+import json
+import importlib.util
+from typing import Dict, Any, List, Callable, Iterator, Optional, Tuple
+
+import pytest
+
+DSN = os.environ.get('QUERY_PLAN_TEST_DSN')
+pytestmark = pytest.mark.skipif(not DSN, reason='QUERY_PLAN_TEST_DSN is not set')
+
+SCHEMA = 't_p42286306_app_development_proj'
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+MIGRATIONS = sorted(glob.glob(os.path.join(BACKEND_DIR, '..', 'db_migrations', 'V*.sql')))
+BUFFER_BUDGET = int(os.environ.get('QUERY_PLAN_BUFFER_BUDGET', '1000'))
+
+USERS = 20000
+MESSAGES = 200000
+ROOMS = 20
+IDEMPOTENCY_KEYS = 100000
+NEWS = 5000
+CONTACTS = 5000
+SUBJECTS = [
+    'РОВ', 'Русский язык', 'Математика', 'Литература', 'Английский язык', 'История',
+    'Изо', 'Труд', 'Информатика', 'Музыка', 'География', 'Биология'
+]
+# Tables that grow with users and time; a sequential scan on any of them is a bug
+LARGE_TABLES = {'users', 'messages', 'news', 'contacts', 'lesson_likes', 'lesson_likes_hourly', 'idempotency_keys', 'changes'}
+# Unbounded list reads that must be served in index order rather than by a sort
+EXPECTED_INDEXES = {
+    'news list': ('Index Scan', 'idx_news_created_at'),
+    'contacts list': ('Index Only Scan', 'idx_contacts_created_at'),
+}
+
+SEED = [
+    ("INSERT INTO users (username, password_hash) "
+     "SELECT 'user' || g, encode(sha256('secret'), 'hex') FROM generate_series(1, %s) g", (USERS,)),
+    ("INSERT INTO admins (user_id, username) SELECT g, 'user' || g FROM generate_series(1, 20) g", None),
+    ("INSERT INTO messages (user_id, username, message, room_id, created_at) "
+     "SELECT 1 + g %% %s, 'user' || (1 + g %% %s), 'message ' || g, 'room-' || (g %% %s), "
+     "LOCALTIMESTAMP - g * INTERVAL '30 seconds' FROM generate_series(1, %s) g",
+     (USERS, USERS, ROOMS, MESSAGES)),
+    # Oldest first, as rows arrive in production
+    ("INSERT INTO news (title, content, created_at) "
+     "SELECT 'News ' || g, repeat('text ', 50), LOCALTIMESTAMP - (%s - g) * INTERVAL '1 hour' "
+     "FROM generate_series(1, %s) g", (NEWS, NEWS)),
+    ("INSERT INTO contacts (name, phone, role, created_at) "
+     "SELECT 'Contact ' || g, '+7900' || lpad(g::text, 7, '0'), "
+     "(ARRAY['ученик', 'админ', 'учитель'])[1 + g %% 3], LOCALTIMESTAMP - (%s - g) * INTERVAL '1 hour' "
+     "FROM generate_series(1, %s) g", (CONTACTS, CONTACTS)),
+    ("INSERT INTO lesson_likes (user_id, subject, created_at) "
+     "SELECT u, s, LOCALTIMESTAMP - ((u * 7 + length(s)) %% 8760) * INTERVAL '1 hour' "
+     "FROM generate_series(1, %s) u CROSS JOIN unnest(%s::varchar[]) s WHERE (u + length(s)) %% 2 = 0",
+     (USERS, SUBJECTS)),
+    ("INSERT INTO lesson_likes_hourly (subject, bucket, likes) "
+     "SELECT subject, date_trunc('hour', created_at), COUNT(*) FROM lesson_likes "
+     "GROUP BY subject, date_trunc('hour', created_at)", None),
+    ("INSERT INTO lesson_likes_totals (subject, likes) "
+     "SELECT subject, COUNT(*) FROM lesson_likes GROUP BY subject", None),
+    ("INSERT INTO idempotency_keys (key, status_code, body, created_at) "
+     "SELECT 'chat:' || g || ':' || md5(g::text), 201, '{}', LOCALTIMESTAMP - (g %% 72000) * INTERVAL '1 second' "
+     "FROM generate_series(1, %s) g", (IDEMPOTENCY_KEYS,)),
+    ("INSERT INTO chat_presence (room_id, user_id, username, last_seen, typing_until) "
+     "SELECT 'room-' || (g %% %s), g, 'user' || g, now(), now() FROM generate_series(1, 50) g", (ROOMS,)),
+]
+
+class PlannedCursor:
+    '''Cursor that records the EXPLAIN (ANALYZE, BUFFERS) plan of each statement before running it'''
+
+    def __init__(self, cursor: Any, plans: List[Tuple[str, Dict[str, Any]]]) -> None:
+        self._cursor = cursor
+        self._plans = plans
+
+    def execute(self, sql: Any, params: Any = None) -> None:
+        prefix = 'EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) '
+        explain = prefix.encode('utf-8') + sql if isinstance(sql, bytes) else prefix + sql
+        # ANALYZE really runs the statement, so undo it before the handler runs it for real
+        self._cursor.execute('SAVEPOINT plan')
+        self._cursor.execute(explain, params)
+        output = self._cursor.fetchone()[0]
+        plan = (json.loads(output) if isinstance(output, str) else output)[0]['Plan']
+        self._cursor.execute('ROLLBACK TO SAVEPOINT plan')
+        self._cursor.execute('RELEASE SAVEPOINT plan')
+        text = sql.decode('utf-8') if isinstance(sql, bytes) else sql
+        self._plans.append((text, plan))
+        self._cursor.execute(sql, params)
+
+    def __enter__(self) -> 'PlannedCursor':
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        pass
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._cursor, name)
+
+class PlannedConnection:
+    '''The suite's connection as a handler sees it; commits are undone when the handler closes it'''
+
+    def __init__(self, conn: Any, plans: List[Tuple[str, Dict[str, Any]]]) -> None:
+        self._conn = conn
+        self._plans = plans
+        self._conn.cursor().execute('SAVEPOINT handler')
+
+    @property
+    def autocommit(self) -> bool:
+        return False
+
+    @autocommit.setter
+    def autocommit(self, value: bool) -> None:
+        pass
+
+    def cursor(self) -> PlannedCursor:
+        return PlannedCursor(self._conn.cursor(), self._plans)
+
+    def commit(self) -> None:
+        pass
+
+    def rollback(self) -> None:
+        self._conn.cursor().execute('ROLLBACK TO SAVEPOINT handler')
+
+    def close(self) -> None:
+        self._conn.rollback()
+
+class PlannedDriver:
+    '''Stands in for the psycopg2 module inside a handler; everything but connect is the real driver'''
+
+    def __init__(self, driver: Any, conn: Any, plans: List[Tuple[str, Dict[str, Any]]]) -> None:
+        self._driver = driver
+        self._conn = conn
+        self._plans = plans
+
+    def connect(self, *args: Any, **kwargs: Any) -> PlannedConnection:
+        return PlannedConnection(self._conn, self._plans)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._driver, name)
+
+def load_function(name: str) -> Any:
+    spec = importlib.util.spec_from_file_location(f"plan_{name.replace('-', '_')}", os.path.join(BACKEND_DIR, name, 'index.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def walk(node: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    yield node
+    for child in node.get('Plans', []):
+        yield from walk(child)
+
+@pytest.fixture(scope='module')
+def database() -> Iterator[Tuple[Any, Dict[str, Any]]]:
+    psycopg2 = pytest.importorskip('psycopg2')
+    conn = psycopg2.connect(DSN)
+    cur = conn.cursor()
+    cur.execute("SELECT 1 FROM information_schema.schemata WHERE schema_name = %s", (SCHEMA,))
+    if cur.fetchone():
+        conn.close()
+        pytest.skip(f'schema {SCHEMA} already exists; point QUERY_PLAN_TEST_DSN at a scratch database')
+
+    try:
+        cur.execute(f'CREATE SCHEMA {SCHEMA}')
+        cur.execute(f'SET search_path TO {SCHEMA}, public')
+        for path in MIGRATIONS:
+            with open(path, encoding='utf-8') as f:
+                cur.execute(f.read())
+        for sql, params in SEED:
+            cur.execute(sql, params)
+        conn.commit()
+        conn.autocommit = True
+        cur.execute('VACUUM ANALYZE')
+        conn.autocommit = False
+
+        cur.execute("SELECT id, user_id FROM messages ORDER BY id LIMIT 1")
+        message_id, owner_id = cur.fetchone()
+        cur.execute("SELECT MIN(id) FROM news")
+        news_id = cur.fetchone()[0]
+        cur.execute("SELECT MIN(id) FROM contacts")
+        contact_id = cur.fetchone()[0]
+        # The seed is one transaction; a client that has seen it polls from the next txid
+        cur.execute(f"SELECT MAX(txid) + 1 FROM {SCHEMA}.changes")
+        caught_up = cur.fetchone()[0]
+        conn.commit()
+
+        yield conn, {
+            'message_id': message_id,
+            'owner_id': owner_id,
+            'news_id': news_id,
+            'contact_id': contact_id,
+            'since': caught_up
+        }
+    finally:
+        conn.rollback()
+        conn.autocommit = True
+        cur.execute(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE')
+        conn.close()
+
+def get(params: Dict[str, Any]) -> Dict[str, Any]:
+    return {'httpMethod': 'GET', 'queryStringParameters': params}
+
+def send(method: str, body: str, headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    return {'httpMethod': method, 'body': body, 'headers': headers or {}}
+
+def delete(params: Dict[str, Any]) -> Dict[str, Any]:
+    return {'httpMethod': 'DELETE', 'queryStringParameters': params}
+
+def reset_presence_sync(module: Any) -> None:
+    module._presence_state['synced_at'] = 0.0
+
+SCENARIOS: List[Tuple[str, str, Callable[[Dict[str, Any]], Dict[str, Any]], Optional[Callable[[Any], None]]]] = [
+    ('auth login', 'auth',
+     lambda seed: send('POST', '{"action": "login", "username": "user42", "password": "secret"}'), None),
+    ('auth register', 'auth',
+     lambda seed: send('POST', '{"action": "register", "username": "newcomer", "password": "secret"}'), None),
+    ('chat list room', 'chat', lambda seed: get({'roomId': 'room-3'}), None),
+    ('chat send', 'chat',
+     lambda seed: send('POST', f'{{"userId": {seed["owner_id"]}, "username": "user", "message": "hi", "roomId": "room-3"}}',
+                       {'Idempotency-Key': 'plan-check-send'}), None),
+    ('chat edit', 'chat',
+     lambda seed: send('PUT', f'{{"messageId": {seed["message_id"]}, "userId": {seed["owner_id"]}, "message": "edited"}}'), None),
+    ('chat delete', 'chat',
+     lambda seed: delete({'messageId': str(seed['message_id']), 'userId': str(seed['owner_id'])}), None),
+    ('chat heartbeat', 'chat',
+     lambda seed: send('POST', '{"action": "heartbeat", "userId": 7, "username": "user7", "roomId": "room-3", "typing": true}'),
+     reset_presence_sync),
+    ('chat presence', 'chat', lambda seed: get({'view': 'presence', 'roomId': 'room-3'}), reset_presence_sync),
+    ('news list', 'news', lambda seed: get({}), None),
+    ('news create', 'news', lambda seed: send('POST', '{"title": "Title", "content": "Body"}'), None),
+    ('news update', 'news',
+     lambda seed: send('PUT', f'{{"id": {seed["news_id"]}, "title": "Title", "content": "Body"}}'), None),
+    ('news delete', 'news', lambda seed: delete({'id': str(seed['news_id'])}), None),
+    ('contacts list', 'contacts', lambda seed: get({}), None),
+    ('contacts create', 'contacts',
+     lambda seed: send('POST', '{"name": "Name", "phone": "+79000000000", "role": "ученик"}'), None),
+    ('contacts update', 'contacts',
+     lambda seed: send('PUT', f'{{"id": {seed["contact_id"]}, "name": "Name", "phone": "+79000000000", "role": "учитель"}}'), None),
+    ('contacts delete', 'contacts', lambda seed: delete({'id': str(seed['contact_id'])}), None),
+    ('likes count', 'lesson-likes', lambda seed: get({'subject': 'Математика', 'userId': '42'}), None),
+    ('likes leaderboard', 'lesson-likes', lambda seed: get({'view': 'leaderboard'}), None),
+    ('likes toggle', 'lesson-likes',
+     lambda seed: send('POST', '{"userId": 43, "subject": "Математика", "action": "like"}',
+                       {'Idempotency-Key': 'plan-check-like'}), None),
+    ('sync full', 'sync', lambda seed: get({}), None),
+    ('sync since', 'sync', lambda seed: get({'since': str(seed['since'])}), None),
+]
+
+@pytest.mark.parametrize('scenario, function_name, build_event, prepare', SCENARIOS, ids=[s[0] for s in SCENARIOS])
+def test_statement_plans(database: Tuple[Any, Dict[str, Any]], scenario: str, function_name: str,
+                         build_event: Callable[[Dict[str, Any]], Dict[str, Any]], prepare: Optional[Callable[[Any], None]]) -> None:
+    conn, seed = database
+    plans: List[Tuple[str, Dict[str, Any]]] = []
+    module = load_function(function_name)
+    module.load_psycopg2()
+    module.psycopg2 = PlannedDriver(module.psycopg2, conn, plans)
+    if prepare:
+        prepare(module)
+
+    response = module.handler(build_event(seed), None)
+
+    assert response['statusCode'] < 400, response['body']
+    assert 'X-Stale' not in response['headers'], response['body']
+    assert plans, 'handler ran no statements'
+    for sql, plan in plans:
+        seq_scans = sorted({node['Relation Name'] for node in walk(plan)
+                            if node['Node Type'] == 'Seq Scan' and node.get('Relation Name') in LARGE_TABLES})
+        assert not seq_scans, f'Seq Scan on {", ".join(seq_scans)}: {sql}'
+        buffers = plan.get('Shared Hit Blocks', 0) + plan.get('Shared Read Blocks', 0)
+        assert buffers <= BUFFER_BUDGET, f'{buffers} buffers (budget {BUFFER_BUDGET}): {sql}'
+    if scenario in EXPECTED_INDEXES:
+        node_type, index_name = EXPECTED_INDEXES[scenario]
+        assert any(node['Node Type'] == node_type and node.get('Index Name') == index_name
+                   for _, plan in plans for node in walk(plan)), f'no {node_type} using {index_name}'
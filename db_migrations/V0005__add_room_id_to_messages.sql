@@ -0,0 +1,5 @@
+-- Split chat into rooms (per class, per subject, ...)
+ALTER TABLE messages ADD COLUMN IF NOT EXISTS room_id VARCHAR(50) NOT NULL DEFAULT 'general';
+
+-- Polls read one room at a time, newest first
+CREATE INDEX IF NOT EXISTS idx_messages_room_created_at ON messages(room_id, created_at DESC);
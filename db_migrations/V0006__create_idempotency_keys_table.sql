@@ -0,0 +1,10 @@
+-- Responses of retried chat POST / like toggles, keyed by the client's Idempotency-Key
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    key VARCHAR(255) PRIMARY KEY,
+    status_code INTEGER,
+    body TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Used to purge expired keys
+CREATE INDEX IF NOT EXISTS idx_idempotency_keys_created_at ON idempotency_keys(created_at);
@@ -0,0 +1,30 @@
+-- Likes per subject per hour, for trending over a sliding window
+CREATE TABLE IF NOT EXISTS t_p42286306_app_development_proj.lesson_likes_hourly (
+  subject VARCHAR(100) NOT NULL,
+  bucket TIMESTAMP NOT NULL,
+  likes INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (subject, bucket)
+);
+
+CREATE INDEX IF NOT EXISTS idx_lesson_likes_hourly_bucket ON t_p42286306_app_development_proj.lesson_likes_hourly(bucket);
+
+-- All-time likes per subject, for the leaderboard
+CREATE TABLE IF NOT EXISTS t_p42286306_app_development_proj.lesson_likes_totals (
+  subject VARCHAR(100) PRIMARY KEY,
+  likes INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE INDEX IF NOT EXISTS idx_lesson_likes_totals_likes ON t_p42286306_app_development_proj.lesson_likes_totals(likes DESC);
+
+-- Backfill from existing likes
+INSERT INTO t_p42286306_app_development_proj.lesson_likes_hourly (subject, bucket, likes)
+SELECT subject, date_trunc('hour', created_at), COUNT(*)
+FROM t_p42286306_app_development_proj.lesson_likes
+GROUP BY subject, date_trunc('hour', created_at)
+ON CONFLICT (subject, bucket) DO NOTHING;
+
+INSERT INTO t_p42286306_app_development_proj.lesson_likes_totals (subject, likes)
+SELECT subject, COUNT(*)
+FROM t_p42286306_app_development_proj.lesson_likes
+GROUP BY subject
+ON CONFLICT (subject) DO NOTHING;
@@ -0,0 +1,8 @@
+-- Per-user lookups on chat messages, and the messages.user_id -> users.id foreign key check when a user is deleted
+CREATE INDEX IF NOT EXISTS idx_messages_user_id ON messages(user_id);
+
+-- News list is read newest first
+CREATE INDEX IF NOT EXISTS idx_news_created_at ON news(created_at DESC);
+
+-- Contacts list is read newest first; covering so it can be served by an index-only scan
+CREATE INDEX IF NOT EXISTS idx_contacts_created_at ON contacts(created_at DESC) INCLUDE (id, name, phone, role);
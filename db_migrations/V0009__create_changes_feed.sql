@@ -0,0 +1,41 @@
+-- Append-only change log for news, contacts and like counts; clients sync from their last version
+CREATE TABLE IF NOT EXISTS t_p42286306_app_development_proj.changes (
+  version BIGSERIAL PRIMARY KEY,
+  entity VARCHAR(20) NOT NULL,
+  entity_key VARCHAR(100) NOT NULL,
+  op VARCHAR(10) NOT NULL CHECK (op IN ('upsert', 'delete')),
+  changed_at TIMESTAMP DEFAULT clock_timestamp()
+);
+
+CREATE OR REPLACE FUNCTION t_p42286306_app_development_proj.record_change() RETURNS trigger AS $$
+BEGIN
+  IF TG_TABLE_NAME = 'lesson_likes' THEN
+    -- A like or unlike changes the subject's count, which clients always upsert
+    IF TG_OP = 'DELETE' THEN
+      INSERT INTO t_p42286306_app_development_proj.changes (entity, entity_key, op) VALUES ('likes', OLD.subject, 'upsert');
+    ELSE
+      INSERT INTO t_p42286306_app_development_proj.changes (entity, entity_key, op) VALUES ('likes', NEW.subject, 'upsert');
+    END IF;
+  ELSIF TG_OP = 'DELETE' THEN
+    INSERT INTO t_p42286306_app_development_proj.changes (entity, entity_key, op) VALUES (TG_TABLE_NAME, OLD.id::text, 'delete');
+  ELSE
+    INSERT INTO t_p42286306_app_development_proj.changes (entity, entity_key, op) VALUES (TG_TABLE_NAME, NEW.id::text, 'upsert');
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS news_record_change ON news;
+CREATE TRIGGER news_record_change
+  AFTER INSERT OR UPDATE OR DELETE ON news
+  FOR EACH ROW EXECUTE FUNCTION t_p42286306_app_development_proj.record_change();
+
+DROP TRIGGER IF EXISTS contacts_record_change ON contacts;
+CREATE TRIGGER contacts_record_change
+  AFTER INSERT OR UPDATE OR DELETE ON contacts
+  FOR EACH ROW EXECUTE FUNCTION t_p42286306_app_development_proj.record_change();
+
+DROP TRIGGER IF EXISTS lesson_likes_record_change ON t_p42286306_app_development_proj.lesson_likes;
+CREATE TRIGGER lesson_likes_record_change
+  AFTER INSERT OR DELETE ON t_p42286306_app_development_proj.lesson_likes
+  FOR EACH ROW EXECUTE FUNCTION t_p42286306_app_development_proj.record_change();
@@ -0,0 +1,11 @@
+-- Who is online / typing per room; rebuilt from heartbeats, so it does not need WAL or crash safety
+CREATE UNLOGGED TABLE IF NOT EXISTS chat_presence (
+    room_id VARCHAR(50) NOT NULL,
+    user_id INTEGER NOT NULL,
+    username VARCHAR(50) NOT NULL,
+    last_seen TIMESTAMPTZ NOT NULL,
+    typing_until TIMESTAMPTZ NOT NULL,
+    PRIMARY KEY (room_id, user_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_chat_presence_last_seen ON chat_presence(last_seen);
@@ -0,0 +1,5 @@
+-- Transaction that wrote each change. Sync hands out changes per transaction, and only once
+-- every transaction below the reader's snapshot xmin has finished, so a slow commit is never skipped
+ALTER TABLE t_p42286306_app_development_proj.changes ADD COLUMN IF NOT EXISTS txid BIGINT NOT NULL DEFAULT txid_current();
+
+CREATE INDEX IF NOT EXISTS idx_changes_txid_version ON t_p42286306_app_development_proj.changes(txid, version);
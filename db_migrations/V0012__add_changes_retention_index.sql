@@ -0,0 +1,2 @@
+-- The sync function purges changes older than its retention window
+CREATE INDEX IF NOT EXISTS idx_changes_changed_at ON t_p42286306_app_development_proj.changes(changed_at);
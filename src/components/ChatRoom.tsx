@@ -5,6 +5,7 @@ import { Input } from '@/components/ui/input';
 import { ScrollArea } from '@/components/ui/scroll-area';
 import Icon from '@/components/ui/icon';
 import AdminGiveModal from '@/components/AdminGiveModal';
+import { createIdempotencyKey } from '@/lib/utils';
 
 const CHAT_URL = 'https://functions.poehali.dev/a9200a7a-4ac5-47b0-b48a-aa315785eb3c';
 
@@ -15,6 +16,12 @@ type Message = {
   message: string;
   createdAt: string;
   isAdmin: boolean;
+  roomId: string;
+};
+
+type Presence = {
+  online: { userId: number; username: string }[];
+  typing: string[];
 };
 
 type ChatRoomProps = {
@@ -26,9 +33,10 @@ type ChatRoomProps = {
   adminChatMode?: boolean;
   adminAnonimMode?: boolean;
   adminPromocode?: string;
+  roomId?: string;
 };
 
-export default function ChatRoom({ userId, username, onLogout, isAdmin, onAdminStatusChange, adminChatMode = false, adminAnonimMode = false, adminPromocode = 'admin121114' }: ChatRoomProps) {
+export default function ChatRoom({ userId, username, onLogout, isAdmin, onAdminStatusChange, adminChatMode = false, adminAnonimMode = false, adminPromocode = 'admin121114', roomId = 'general' }: ChatRoomProps) {
   const [messages, setMessages] = useState<Message[]>([]);
   const [inputMessage, setInputMessage] = useState('');
   const [loading, setLoading] = useState(false);
@@ -38,10 +46,13 @@ export default function ChatRoom({ userId, username, onLogout, isAdmin, onAdminS
   const [editingMessageId, setEditingMessageId] = useState<number | null>(null);
   const [editText, setEditText] = useState('');
   const [showAdminGiveModal, setShowAdminGiveModal] = useState(false);
+  const [presence, setPresence] = useState<Presence>({ online: [], typing: [] });
+  const lastTypingSentRef = useRef(0);
+  const pendingSendRef = useRef<{ key: string; body: string } | null>(null);
 
   const fetchMessages = async () => {
     try {
-      const response = await fetch(CHAT_URL);
+      const response = await fetch(`${CHAT_URL}?roomId=${encodeURIComponent(roomId)}`);
       const data = await response.json();
       if (data.messages) {
         setMessages(data.messages);
@@ -60,7 +71,57 @@ export default function ChatRoom({ userId, username, onLogout, isAdmin, onAdminS
         clearInterval(intervalRef.current);
       }
     };
-  }, []);
+  }, [roomId]);
+
+  const sendHeartbeat = async (typing = false) => {
+    try {
+      await fetch(CHAT_URL, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ action: 'heartbeat', userId, username, roomId, typing })
+      });
+    } catch (err) {
+      console.error('Failed to send heartbeat:', err);
+    }
+  };
+
+  const fetchPresence = async () => {
+    try {
+      const response = await fetch(`${CHAT_URL}?view=presence&roomId=${encodeURIComponent(roomId)}`);
+      const data = await response.json();
+      if (data.online) {
+        setPresence({ online: data.online, typing: data.typing || [] });
+      }
+    } catch (err) {
+      console.error('Failed to fetch presence:', err);
+    }
+  };
+
+  useEffect(() => {
+    sendHeartbeat();
+    fetchPresence();
+    const heartbeatInterval = setInterval(sendHeartbeat, 20000);
+    const presenceInterval = setInterval(fetchPresence, 10000);
+
+    return () => {
+      clearInterval(heartbeatInterval);
+      clearInterval(presenceInterval);
+    };
+  }, [roomId]);
+
+  const handleInputChange = (value: string) => {
+    setInputMessage(value);
+    const now = Date.now();
+    if (value.trim() && now - lastTypingSentRef.current > 4000) {
+      lastTypingSentRef.current = now;
+      sendHeartbeat(true);
+    } else if (!value.trim() && lastTypingSentRef.current) {
+      lastTypingSentRef.current = 0;
+      sendHeartbeat(false);
+    }
+  };
+
+  const typingOthers = presence.typing.filter((name) => name !== username);
 
   useEffect(() => {
     if (scrollRef.current) {
@@ -84,16 +145,24 @@ export default function ChatRoom({ userId, username, onLogout, isAdmin, onAdminS
       const displayUsername = adminAnonimMode && isAdmin ? 'Аноним' : username;
       const shouldShowAsAdmin = isAdmin && adminChatMode && !adminAnonimMode;
       
+      const body = JSON.stringify({
+        userId,
+        username: displayUsername,
+        message: inputMessage.trim(),
+        isAdmin: shouldShowAsAdmin,
+        roomId
+      });
+      // Resending the same message after a network error reuses its key, so it is stored once
+      if (pendingSendRef.current?.body !== body) {
+        pendingSendRef.current = { key: createIdempotencyKey(), body };
+      }
+
       const response = await fetch(CHAT_URL, {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({
-          userId,
-          username: displayUsername,
-          message: inputMessage.trim(),
-          isAdmin: shouldShowAsAdmin
-        })
+        headers: { 'Content-Type': 'application/json', 'Idempotency-Key': pendingSendRef.current.key },
+        body
       });
+      pendingSendRef.current = null;
 
       const data = await response.json();
 
@@ -108,6 +177,8 @@ export default function ChatRoom({ userId, username, onLogout, isAdmin, onAdminS
       }
 
       setInputMessage('');
+      lastTypingSentRef.current = 0;
+      sendHeartbeat(false);
       await fetchMessages();
     } catch (err) {
       setError('Ошибка подключения');
@@ -189,7 +260,7 @@ export default function ChatRoom({ userId, username, onLogout, isAdmin, onAdminS
               <div>
                 <h3 className="font-semibold">Чат класса 5У</h3>
                 <p className="text-sm text-muted-foreground">
-                  Вы: {username}
+                  Вы: {username} · Онлайн: {presence.online.length}
                 </p>
               </div>
             </div>
@@ -286,6 +357,12 @@ export default function ChatRoom({ userId, username, onLogout, isAdmin, onAdminS
             </div>
           </ScrollArea>
 
+          {typingOthers.length > 0 && (
+            <p className="text-xs text-muted-foreground animate-pulse">
+              {typingOthers.join(', ')} {typingOthers.length === 1 ? 'печатает' : 'печатают'}...
+            </p>
+          )}
+
           {error && (
             <div className="p-3 rounded-lg bg-destructive/10 border border-destructive/50 flex items-center gap-2">
               <Icon name="AlertCircle" size={18} className="text-destructive" />
@@ -297,7 +374,7 @@ export default function ChatRoom({ userId, username, onLogout, isAdmin, onAdminS
             <Input
               placeholder="Напишите сообщение..."
               value={inputMessage}
-              onChange={(e) => setInputMessage(e.target.value)}
+              onChange={(e) => handleInputChange(e.target.value)}
               onKeyPress={handleKeyPress}
               className="bg-background/50"
               maxLength={1000}
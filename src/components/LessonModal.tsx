@@ -1,7 +1,8 @@
-import { useState, useEffect } from 'react';
+import { useState, useEffect, useRef } from 'react';
 import Icon from '@/components/ui/icon';
 import { Button } from '@/components/ui/button';
 import { Card, CardContent } from '@/components/ui/card';
+import { createIdempotencyKey } from '@/lib/utils';
 
 type Lesson = {
   number: number;
@@ -36,6 +37,7 @@ export default function LessonModal({ lesson, onClose, userId }: LessonModalProp
   const [hasLiked, setHasLiked] = useState<boolean>(false);
   const [timeStatus, setTimeStatus] = useState<string>('');
   const [isLessonActive, setIsLessonActive] = useState<boolean>(false);
+  const pendingToggleRef = useRef<{ key: string; body: string } | null>(null);
 
   useEffect(() => {
     if (!lesson) return;
@@ -96,18 +98,26 @@ export default function LessonModal({ lesson, onClose, userId }: LessonModalProp
   const toggleLike = async () => {
     if (!lesson || !userId) return;
 
+    const body = JSON.stringify({
+      userId,
+      subject: lesson.subject,
+      action: hasLiked ? 'unlike' : 'like'
+    });
+    // Retrying the same toggle after a network error reuses its key, so it is applied once
+    if (pendingToggleRef.current?.body !== body) {
+      pendingToggleRef.current = { key: createIdempotencyKey(), body };
+    }
+
     try {
       const response = await fetch('https://functions.poehali.dev/de9b8f4e-33f8-4022-b463-c072c20d423d', {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
+          'Idempotency-Key': pendingToggleRef.current.key,
         },
-        body: JSON.stringify({
-          userId,
-          subject: lesson.subject,
-          action: hasLiked ? 'unlike' : 'like'
-        })
+        body
       });
+      pendingToggleRef.current = null;
 
       if (response.ok) {
         const data = await response.json();
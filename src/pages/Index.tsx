@@ -10,6 +10,23 @@ import AdminConsole from '@/components/AdminConsole';
 import LessonEditModal from '@/components/LessonEditModal';
 import AdminGiveModal from '@/components/AdminGiveModal';
 
+const SNAPSHOT_BASE_URL = import.meta.env.VITE_SNAPSHOT_BASE_URL as string | undefined;
+
+const fetchListJson = async (snapshotFile: string, functionUrl: string, preferSnapshot: boolean) => {
+  if (preferSnapshot && SNAPSHOT_BASE_URL) {
+    try {
+      const response = await fetch(`${SNAPSHOT_BASE_URL}/${snapshotFile}`);
+      if (response.ok) {
+        return await response.json();
+      }
+    } catch (err) {
+      console.error(`Failed to fetch ${snapshotFile} snapshot:`, err);
+    }
+  }
+  const response = await fetch(functionUrl);
+  return response.json();
+};
+
 type Student = {
   id: number;
   name: string;
@@ -104,24 +121,22 @@ export default function Index() {
       setSchedule(defaultSchedule);
     }
     
-    fetchNews();
-    fetchContacts();
+    fetchNews(true);
+    fetchContacts(true);
   }, []);
 
-  const fetchNews = async () => {
+  const fetchNews = async (preferSnapshot = false) => {
     try {
-      const response = await fetch('https://functions.poehali.dev/1cfe69cf-3e6e-48a0-b368-c16c67f14a86');
-      const data = await response.json();
+      const data = await fetchListJson('news.json', 'https://functions.poehali.dev/1cfe69cf-3e6e-48a0-b368-c16c67f14a86', preferSnapshot);
       setNewsFromDb(data.news || []);
     } catch (err) {
       console.error('Failed to fetch news:', err);
     }
   };
 
-  const fetchContacts = async () => {
+  const fetchContacts = async (preferSnapshot = false) => {
     try {
-      const response = await fetch('https://functions.poehali.dev/9023ff53-a964-4de8-959b-f938d884ff4a');
-      const data = await response.json();
+      const data = await fetchListJson('contacts.json', 'https://functions.poehali.dev/9023ff53-a964-4de8-959b-f938d884ff4a', preferSnapshot);
       setContactsFromDb(data.contacts || []);
     } catch (err) {
       console.error('Failed to fetch contacts:', err);